@@ -0,0 +1,61 @@
+# cell_store.py
+def pitch_classes(cell):
+    return tuple(note % 12 for note in cell)
+
+def contour(cell):
+    """Intervals from the first note, the same in every octave"""
+    return tuple(note - cell[0] for note in cell)
+
+class CellStore:
+    """Index of every cell set by the pitch class of its first and last note,
+    and by exact notes and pitch classes for resolution cell lookups.
+
+    Built once when data.py loads, so finding the cells that can sit on
+    either side of a junction is a dictionary lookup instead of a rescan.
+    """
+    def __init__(self, cell_sets):
+        self.cell_sets = cell_sets
+        self.by_start = {}
+        self.by_end = {}
+        self.exact = {}
+        self.by_shape = {}
+        self.by_pitch_classes = {}
+        for name, cells in cell_sets.items():
+            starts = {}
+            ends = {}
+            shapes = {}
+            classes = {}
+            for cell in cells:
+                starts.setdefault(cell[0] % 12, []).append(cell)
+                ends.setdefault(cell[-1] % 12, []).append(cell)
+                # The first cell in set order wins, as with a linear scan
+                shapes.setdefault((pitch_classes(cell), contour(cell)), cell)
+                classes.setdefault(pitch_classes(cell), cell)
+            self.by_start[name] = starts
+            self.by_end[name] = ends
+            self.exact[name] = set(cells)
+            self.by_shape[name] = shapes
+            self.by_pitch_classes[name] = classes
+
+    def starting_with(self, set_name, pitch_class):
+        """All cells of a set whose first note has the given pitch class"""
+        return self.by_start[set_name].get(pitch_class, [])
+
+    def ending_on(self, set_name, pitch_class):
+        """All cells of a set whose last note has the given pitch class"""
+        return self.by_end[set_name].get(pitch_class, [])
+
+    def matching_cell(self, set_name, cell):
+        """The cell of a set that cell stands for, or None.
+
+        That is cell itself when it is in the set, otherwise the first cell
+        with the same pitch classes, preferring one with the same contour so
+        an octave-shifted cell keeps its shape.
+        """
+        if cell in self.exact[set_name]:
+            return cell
+        classes = pitch_classes(cell)
+        match = self.by_shape[set_name].get((classes, contour(cell)))
+        if match is None:
+            match = self.by_pitch_classes[set_name].get(classes)
+        return match
@@ -0,0 +1,117 @@
+# chain_sampler.py
+import random
+from itertools import accumulate
+from constants import F3_PITCH, E5_PITCH
+
+class ChainSampler:
+    """Counts and samples backward cell chains uniformly, within the practice range.
+
+    A chain starts from a resolution cell and prepends one cell from each of
+    cell_sets in turn, each new cell ending on the pitch class the chain
+    currently starts with. adjust_right_cell then moves the chain built so far
+    by whole octaves so the junction notes coincide, which means a partial
+    chain is fully described by its first note and its lowest and highest
+    note. Counting completions over those states, separately for every
+    transposition, gives the per-key feasibility tables: cells that would
+    push the phrase out of F3_PITCH..E5_PITCH get zero weight, and drawing
+    every cell in proportion to the completions it leaves gives every valid
+    chain the same probability without ever hitting a dead end.
+
+    For practice, where the same cell coming back soon is what matters,
+    sample() also draws in shuffled rounds, like a Cycler: at every choice
+    point each cell that can complete a chain is used once before any of
+    them comes back. The caller owns the round state, so separate runs (and
+    seeded batches) do not disturb each other.
+    """
+    def __init__(self, store, resolution_set, cell_sets):
+        self.store = store
+        self.resolution_set = resolution_set
+        self.cell_sets = list(cell_sets)
+        self.resolution_cells = store.cell_sets[resolution_set]
+        self._ways = {}
+        # (semitones, depth, state) -> (candidates, cumulative weights), filled as chains are drawn
+        self._choices = {}
+        for semitones in range(12):
+            self.count(semitones)
+
+    def _cell_state(self, cell):
+        return cell[0], min(cell), max(cell)
+
+    def _candidates(self, depth, state):
+        """Cells that can be prepended at depth, with the state each of them leads to"""
+        first, low, high = state
+        candidates = []
+        for cell in self.store.ending_on(self.cell_sets[depth], first % 12):
+            shift = cell[-1] - first
+            candidates.append((cell, (cell[0], min(min(cell), low + shift), max(max(cell), high + shift))))
+        return candidates
+
+    def _completions(self, semitones, depth, state):
+        ways = self._ways[semitones]
+        memo_key = (depth, state)
+        if memo_key in ways:
+            return ways[memo_key]
+        if depth == len(self.cell_sets):
+            _, low, high = state
+            count = int(low + semitones >= F3_PITCH and high + semitones <= E5_PITCH)
+        else:
+            count = sum(self._completions(semitones, depth + 1, next_state)
+                        for _, next_state in self._candidates(depth, state))
+        ways[memo_key] = count
+        return count
+
+    def count(self, semitones=0):
+        """Number of complete chains that fit the range once transposed up by semitones"""
+        semitones %= 12
+        self._ways.setdefault(semitones, {})
+        return sum(self._completions(semitones, 0, self._cell_state(cell)) for cell in self.resolution_cells)
+
+    def is_feasible(self, semitones=0):
+        return self.count(semitones) > 0
+
+    def _weighted_choices(self, semitones, depth, state):
+        """Cells (with their next state) that can be drawn at depth, and their cumulative weights"""
+        choice_key = (semitones, depth, state)
+        choices = self._choices.get(choice_key)
+        if choices is None:
+            if depth < 0:
+                candidates = [(cell, self._cell_state(cell)) for cell in self.resolution_cells]
+            else:
+                candidates = self._candidates(depth, state)
+            weights = [self._completions(semitones, depth + 1, next_state) for _, next_state in candidates]
+            choices = self._choices[choice_key] = (candidates, list(accumulate(weights)))
+        return choices
+
+    def sample(self, semitones=0, rng=random, rounds=None):
+        """Draw one complete chain, returned left to right (resolution cell last).
+
+        Uniform over every valid chain, or in shuffled rounds when rounds is
+        a dict kept from one call to the next (start with an empty one).
+        """
+        semitones %= 12
+        candidates, cum_weights = self._weighted_choices(semitones, -1, None)
+        if not cum_weights or not cum_weights[-1]:
+            raise ValueError(f"No chain ending on a {self.resolution_set} cell fits the practice range "
+                             f"when transposed by {semitones} semitones")
+        cell, state = self._draw(semitones, -1, None, rng, rounds)
+        chain = [cell]
+        for depth in range(len(self.cell_sets)):
+            cell, state = self._draw(semitones, depth, state, rng, rounds)
+            chain.append(cell)
+        chain.reverse()
+        return chain
+
+    def _draw(self, semitones, depth, state, rng, rounds):
+        """(cell, next state) drawn at one choice point"""
+        candidates, cum_weights = self._weighted_choices(semitones, depth, state)
+        if rounds is None:
+            return rng.choices(candidates, cum_weights=cum_weights)[0]
+        round_key = (semitones, depth, state)
+        remaining = rounds.get(round_key)
+        if not remaining:
+            # New round: every candidate that can still complete a chain, once
+            remaining = rounds[round_key] = [i for i, total in enumerate(cum_weights)
+                                             if total > (cum_weights[i - 1] if i else 0)]
+        pick = rng.randrange(len(remaining))
+        remaining[pick], remaining[-1] = remaining[-1], remaining[pick]
+        return candidates[remaining.pop()]
@@ -29,4 +29,9 @@ FLAT_KEYS = {"Db", "Ab", "Eb", "Bb", "F", "C"}
 KEYS = {
     "C": 0, "G": 7, "D": 2, "A": 9, "E": 4, "B": 11,
     "F#": 6, "Db": 1, "Ab": 8, "Eb": 3, "Bb": 10, "F": 5
-}
\ No newline at end of file
+}
+
+# Define pitch range (F3 to E5) accepted by the phrase generator, as MIDI
+# numbers: (octave + 1) * 12 + pitch class, so that C4 is 60
+F3_PITCH = 5 + (4 * 12)
+E5_PITCH = 4 + (6 * 12)
@@ -0,0 +1,168 @@
+# corpus_generator.py
+"""Pre-generate phrase corpora for every phrase type and key.
+
+Usage:
+    python corpus_generator.py OUTPUT_DIR [--shards 4] [--phrases-per-shard 10000]
+                               [--phrase-types long_major turnaround ...] [--keys C F ...]
+                               [--format jsonl|bin] [--workers 8] [--seed 0]
+
+The work is split into shards of (phrase type, key, shard number), generated
+on a process pool. Every shard gets its own seed derived from --seed, so
+workers draw independent random streams and a rerun with the same seed gives
+the same files. Shards are written to a temporary name and renamed into
+place, so an interrupted run can simply be restarted: finished shards are
+kept and only the missing ones are generated.
+
+Output layout:
+    OUTPUT_DIR/index.json
+    OUTPUT_DIR/<phrase_type>/<key>/shard-00000.jsonl (or .bin)
+
+JSONL shards hold one {"key": ..., "notes": [MIDI numbers...]} object per
+line. Binary shards hold one record per phrase: a length byte followed by
+that many MIDI numbers, one byte each.
+
+Runs headless; nothing here imports pygame.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from constants import KEYS
+from phrase_generator import CHAIN_SAMPLERS, generate_phrases
+from rng import derive_seed
+
+INDEX_FILE = "index.json"
+FORMATS = {"jsonl": ".jsonl", "bin": ".bin"}
+
+def key_dir_name(key_name):
+    """File-system and URL safe name for a key ("F#" -> "Fsharp")"""
+    return key_name.replace("#", "sharp")
+
+def shard_seed(base_seed, phrase_type, key_name, shard):
+    """Independent 64-bit seed for one shard"""
+    return derive_seed(base_seed, phrase_type, key_name, shard)
+
+def shard_path(phrase_type, key_name, shard, output_format):
+    return os.path.join(phrase_type, key_dir_name(key_name), f"shard-{shard:05d}{FORMATS[output_format]}")
+
+def encode_shard(batch, output_format):
+    if output_format == "jsonl":
+        lines = (json.dumps({"key": key_name, "notes": list(notes)}, separators=(",", ":")) for key_name, notes in batch)
+        return ("\n".join(lines) + "\n").encode()
+    records = bytearray()
+    for _, notes in batch:
+        records.append(len(notes))
+        records.extend(notes)
+    return bytes(records)
+
+def read_shard(path):
+    """Read a shard back as a list of MIDI tuples"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".jsonl"):
+        return [tuple(json.loads(line)["notes"]) for line in data.splitlines() if line]
+    phrases = []
+    position = 0
+    while position < len(data):
+        length = data[position]
+        phrases.append(tuple(data[position + 1:position + 1 + length]))
+        position += 1 + length
+    return phrases
+
+def generate_shard(task):
+    """Generate one shard and publish it atomically. Runs in a worker process."""
+    output_dir, phrase_type, key_name, shard, count, output_format, seed = task
+    entry = {
+        "phrase_type": phrase_type,
+        "key": key_name,
+        "shard": shard,
+        "path": shard_path(phrase_type, key_name, shard, output_format),
+        "format": output_format,
+        "seed": seed,
+    }
+    try:
+        batch = generate_phrases(phrase_type, count, keys=[key_name], seed=seed)
+    except ValueError as e:
+        # This phrase type never fits the range in this key
+        entry.update(count=0, skipped=str(e))
+        return entry
+    payload = encode_shard(batch, output_format)
+    path = os.path.join(output_dir, entry["path"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(payload)
+    os.replace(temp_path, path)
+    entry.update(count=len(batch), bytes=len(payload), sha256=hashlib.sha256(payload).hexdigest())
+    return entry
+
+def load_index(output_dir):
+    path = os.path.join(output_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        index = json.load(f)
+    return {(entry["phrase_type"], entry["key"], entry["shard"]): entry for entry in index["shards"]}
+
+def write_index(output_dir, entries, settings):
+    shards = sorted(entries.values(), key=lambda entry: (entry["phrase_type"], entry["key"], entry["shard"]))
+    index = dict(settings, shards=shards, phrases=sum(entry["count"] for entry in shards))
+    path = os.path.join(output_dir, INDEX_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(temp_path, path)
+
+def is_finished(output_dir, entry, count, output_format, seed):
+    """True when a shard from a previous run matches the current settings and is on disk"""
+    if entry is None or entry["format"] != output_format or entry["seed"] != seed:
+        return False
+    if "skipped" in entry:
+        return True
+    return entry["count"] == count and os.path.exists(os.path.join(output_dir, entry["path"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate phrase corpora for every phrase type and key.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--phrase-types", nargs="+", default=list(CHAIN_SAMPLERS), choices=list(CHAIN_SAMPLERS))
+    parser.add_argument("--keys", nargs="+", default=list(KEYS), choices=list(KEYS))
+    parser.add_argument("--shards", type=int, default=1, help="shards per phrase type and key")
+    parser.add_argument("--phrases-per-shard", type=int, default=10000)
+    parser.add_argument("--format", choices=list(FORMATS), default="jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    settings = {"seed": args.seed, "format": args.format, "phrases_per_shard": args.phrases_per_shard}
+    entries = load_index(args.output_dir)
+
+    tasks = []
+    for phrase_type in args.phrase_types:
+        for key_name in args.keys:
+            for shard in range(args.shards):
+                seed = shard_seed(args.seed, phrase_type, key_name, shard)
+                if is_finished(args.output_dir, entries.get((phrase_type, key_name, shard)), args.phrases_per_shard, args.format, seed):
+                    continue
+                tasks.append((args.output_dir, phrase_type, key_name, shard, args.phrases_per_shard, args.format, seed))
+
+    total = len(tasks)
+    print(f"{total} shards to generate ({len(entries)} already in the index), {args.workers} workers")
+    start = time.time()
+    with Pool(args.workers) as pool:
+        for done, entry in enumerate(pool.imap_unordered(generate_shard, tasks), 1):
+            entries[(entry["phrase_type"], entry["key"], entry["shard"])] = entry
+            write_index(args.output_dir, entries, settings)
+            status = f"skipped: {entry['skipped']}" if "skipped" in entry else f"{entry['count']} phrases"
+            print(f"[{done}/{total}] {entry['phrase_type']} {entry['key']} shard {entry['shard']}: {status} "
+                  f"({time.time() - start:.1f}s)", flush=True)
+    write_index(args.output_dir, entries, settings)
+    print(f"Done: {sum(entry['count'] for entry in entries.values())} phrases in {args.output_dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
 # data.py
-from music_utils import transpose_note
+from music_utils import cells_to_midi, transpose_cells
+from cell_store import CellStore
 from constants import LILYPOND_PITCHES, PITCH_CLASSES_SHARP, PITCH_CLASSES_FLAT, FLAT_KEYS, KEYS
 
 # Unified cells for 7sus4 (dominant) phrases
-CELLS = [
+CELLS = cells_to_midi([
     ["Bb4", "D4", "F4", "F#4", "A4"],
     ["D4", "F4", "E4", "D4", "C4"],
     ["A4", "G4", "F#4", "G4", "C5"],
@@ -36,11 +37,11 @@ CELLS = [
     ["Bb4", "A4", "G4", "F4", "F#4"],
     ["F#4", "A4", "G4", "F4", "E4"],
     ["F#4", "A4", "G4", "E4", "C4"],
-]
+])
 
 # Unified cells for short 25 phrases
 # Additional cells unique to CELLS2
-CELLS2_ADDITIONAL = [
+CELLS2_ADDITIONAL = cells_to_midi([
     ["D5", "Bb4", "A4", "G4", "F#4"],
     ["G4", "A4", "Bb4", "C5", "Db5"],
     ["G4", "A4", "Bb4", "C5", "Eb5"],
@@ -51,13 +52,13 @@ CELLS2_ADDITIONAL = [
     ["Bb3", "D4", "F4", "A4", "Ab4"],
     ["Bb4", "D4", "F4", "A4", "Ab4"],
     ["D4", "F4", "F#4", "A4", "Ab4"],
-]
+])
 
 # Unified cells for short 25 phrases, combining CELLS and additional cells
 CELLS2 = CELLS + CELLS2_ADDITIONAL
 
 # Cells for major phrases (C major cells)
-MAJOR_CELLS = [
+MAJOR_CELLS = cells_to_midi([
     ["G4", "A4", "B4", "D5", "C5"],
     ["E4", "G4", "B4", "D5", "C5"],
     ["E4", "G4", "B4", "D5", "B4"],
@@ -91,10 +92,10 @@ MAJOR_CELLS = [
     ["C5", "E4", "Eb4", "E4", "B4"],
     ["A4", "C5", "B4", "A4", "G4"],
     ["C5", "G4", "Ab4", "B4", "A4"]
-]
+])
 
 # Cells for major resolution (C dominant resolving to F major)
-MAJOR_RESOLUTION_CELLS = [
+MAJOR_RESOLUTION_CELLS = cells_to_midi([
     ["C5", "Bb4", "Eb5", "Db5", "C5"],
     ["C5", "Ab4", "E4", "C4", "G4"],
     ["E4", "Db4", "C4", "Bb3", "A3"],
@@ -117,18 +118,18 @@ MAJOR_RESOLUTION_CELLS = [
     ["A4", "Ab4", "E4", "Db4", "C4"],
     ["Ab4", "E4", "Eb4", "Db4", "C4"],
     ["Ab4", "E5", "Eb5", "Db5", "C5"],
-]
+])
 
 # Cells for minor phrases
-minor_B_cells = [
+minor_B_cells = cells_to_midi([
     ["D4", "C4", "B3", "A3", "G#3"],
     ["B3", "D4", "F4", "A4", "G#4"],
     ["A4", "F4", "D4", "B3", "G#4"],
     ["F4", "D4", "B3", "A3", "G#3"],
     ["B4", "F4", "A4", "G4", "G#4"],
-]
+])
 
-minor_C_cells = [
+minor_C_cells = cells_to_midi([
     ["G#4", "F4", "E4", "D4", "C4"],
     ["G#3", "F4", "E4", "D4", "C4"],
     ["G#3", "B3", "E4", "D4", "C4"],
@@ -136,53 +137,43 @@ minor_C_cells = [
     ["G#4", "F4", "D4", "D#4", "E4"],
     ["G#3", "F4", "D4", "D#4", "E4"],
     ["G#4", "B4", "F4", "D#4", "E4"],
-]
+])
 
 # cells for Gsus7
 # Cells for CELLS transposed down five semitones
-CELLSM5 = [
-    [transpose_note(note, -5, "C") for note in cell] for cell in CELLS
-]
+CELLSM5 = transpose_cells(CELLS, -5)
 
 # minor_C_cells transposed down 2 semitones
-minor_C_cells_down2 = [
-    [transpose_note(note, -2, "C") for note in cell] for cell in minor_C_cells
-]
+minor_C_cells_down2 = transpose_cells(minor_C_cells, -2)
 
 # Turnaround cells as provided
-turnaround_cells_1 = [
+turnaround_cells_1 = cells_to_midi([
     ["A4", "G4", "E4", "F4", "Gb4"],
     ["A4", "E4", "G4", "F4", "Gb4"],
     ["A4", "C4", "E4", "G4", "Gb4"],
     ["A4", "C5", "E5", "G5", "Gb5"],
     ["C5", "Bb4", "A4", "G4", "Gb4"],
     ["C4", "D4", "E4", "G4", "Gb4"],
-]
+])
 # Cells for rhythm changes bar 5-6 resolution (DFB)
-DFB = [
+DFB = cells_to_midi([
     ["A4", "C5", "Eb5", "F#5", "G5"],
     ["C4", "Eb4", "F#4", "A4", "G4"],
     ["F#4", "A4", "G#4", "F#4", "G4"],
     ["D#4", "F#4", "B4", "A4", "G4"],
     ["D#4", "A4", "G#4", "F#4", "G4"],
     ["D#4", "C4", "A3", "F#3", "G3"]
-]
+])
 
 # CELLS in F
 # CELLS transposed up 5 semitones, excluding cells that start with note "F"
-CELLS_up5 = [
-    [transpose_note(note, 5, "C") for note in cell] for cell in CELLS if cell[0][:-1] != "F"
-]
+CELLS_up5 = transpose_cells([cell for cell in CELLS if cell[0] % 12 != 5], 5)
 
 # CELLS transposed up 2 semitones, excluding cells that start with note "F"
-CELLS_up2 = [
-    [transpose_note(note, 2, "C") for note in cell] for cell in CELLS if cell[0][:-1] != "F"
-]
+CELLS_up2 = transpose_cells([cell for cell in CELLS if cell[0] % 12 != 5], 2)
 
 # CELLS transposed down 5 semitones, excluding cells that start with note "F"
-CELLS_down5 = [
-    [transpose_note(note, -5, "C") for note in cell] for cell in CELLS if cell[0][:-1] != "F"
-]
+CELLS_down5 = transpose_cells([cell for cell in CELLS if cell[0] % 12 != 5], -5)
 
 
 # Chord mappings for each key
@@ -378,6 +369,23 @@ def find_7sus4_target_key_for_display(generation_key, chord_type):
     # If no match found, return the generation key
     return generation_key
 
+def get_dominant_or_relative_major_key(phrase_type, tonic_key):
+    """Map the tonic key to the dominant (for major 25) or relative major (for minor 25), or use tonic key directly."""
+    if tonic_key not in KEYS:
+        raise KeyError(f"Invalid tonic key: {tonic_key}")
+    key_semitones = KEYS[tonic_key]
+    if phrase_type in ["short_25_major", "long_25_major"]:
+        dominant_semitones = (key_semitones + 7) % 12
+        for key, semitones in KEYS.items():
+            if semitones == dominant_semitones:
+                return key
+    elif phrase_type in ["short_25_minor", "long_25_minor"]:
+        relative_major_semitones = (key_semitones + 3) % 12
+        for key, semitones in KEYS.items():
+            if semitones == relative_major_semitones:
+                return key
+    return tonic_key
+
 # Add new mappings for specific 7sus4 chord types
 KEY_CHORD_MAP["7sus4_minor"] = {}
 KEY_CHORD_MAP["7sus4_dominant"] = {}
@@ -389,4 +397,37 @@ for key in KEY_CHORD_MAP["7sus4"].keys():
     KEY_CHORD_MAP["7sus4_minor"][key] = get_7sus4_chord_display(key, "minor")
     KEY_CHORD_MAP["7sus4_dominant"][key] = get_7sus4_chord_display(key, "dominant")
     KEY_CHORD_MAP["7sus4_half_dim"][key] = get_7sus4_chord_display(key, "half_dim")
-    KEY_CHORD_MAP["7sus4_altered"][key] = get_7sus4_chord_display(key, "altered")
\ No newline at end of file
+    KEY_CHORD_MAP["7sus4_altered"][key] = get_7sus4_chord_display(key, "altered")
+
+# Junction index over every cell set, built once at import
+CELL_STORE = CellStore({
+    "CELLS": CELLS,
+    "CELLS2": CELLS2,
+    "MAJOR_CELLS": MAJOR_CELLS,
+    "MAJOR_RESOLUTION_CELLS": MAJOR_RESOLUTION_CELLS,
+    "minor_B_cells": minor_B_cells,
+    "minor_C_cells": minor_C_cells,
+    "CELLSM5": CELLSM5,
+    "minor_C_cells_down2": minor_C_cells_down2,
+    "turnaround_cells_1": turnaround_cells_1,
+    "DFB": DFB,
+    "CELLS_up5": CELLS_up5,
+    "CELLS_up2": CELLS_up2,
+    "CELLS_down5": CELLS_down5,
+})
+
+# Backward chains for every phrase type: resolution cell set, then the
+# cell sets prepended one after another (right to left)
+PHRASE_CHAINS = {
+    "7sus4": ("CELLS", ["CELLS"]),
+    "major": ("MAJOR_CELLS", ["MAJOR_CELLS"]),
+    "short_25_major": ("MAJOR_RESOLUTION_CELLS", ["CELLS2"]),
+    "short_25_minor": ("minor_C_cells", ["minor_B_cells"]),
+    "long_major": ("MAJOR_CELLS", ["MAJOR_CELLS", "MAJOR_CELLS", "MAJOR_CELLS"]),
+    "long_7sus4": ("CELLS", ["CELLS", "CELLS", "CELLS"]),
+    "long_25_major": ("MAJOR_RESOLUTION_CELLS", ["CELLS2", "CELLS", "CELLS"]),
+    "long_25_minor": ("minor_C_cells", ["minor_B_cells", "CELLSM5", "CELLSM5"]),
+    "turnaround": ("MAJOR_RESOLUTION_CELLS", ["CELLS2", "minor_C_cells_down2", "turnaround_cells_1"]),
+    "rhythm_changes_56": ("DFB", ["CELLS_up5", "CELLS", "CELLS"]),
+    "ii7_to_v7": ("CELLS_down5", ["CELLS_down5", "CELLS_up2", "CELLS_up2"]),
+}
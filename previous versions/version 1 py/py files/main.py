@@ -1,14 +1,29 @@
+import argparse
 import pygame
 from ui import get_welcome_screen, get_mode_selection, get_key_selection, get_phrase_type, get_length_selection, get_7sus4_chord_type_selection
-from phrase_generator_ui import run_phrase_generator
-from score_generator import cleanup_files
-from random_cycler import random_7sus4_cycler
+from phrase_generator_ui import run_phrase_generator, SCORE_RENDERERS
+from score_generator import REVEAL_EVERY
+from session import Session
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {value}")
+    return value
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Musical Staff Generator")
+    parser.add_argument("--seed", type=int, help="seed for every random choice, to reproduce a session")
+    parser.add_argument("--record", metavar="PATH", help="save the seed and actions to PATH on exit, for session.py")
+    parser.add_argument("--renderer", choices=SCORE_RENDERERS, default="lilypond", help="score backend: LilyPond or the built-in staff renderer")
+    parser.add_argument("--reveal-every", type=positive_int, default=REVEAL_EVERY, metavar="N", help="show every Nth note (and the last) in the partial score")
+    args = parser.parse_args(argv)
+    session = Session(args.seed)
+    print(f"Session seed: {session.seed}")
 
-def main():
     pygame.init()
     screen = pygame.display.set_mode((1000, 600))
     pygame.display.set_caption("Musical Staff Generator")
-    temp_files = ["score.ly", "score.png", "score_partial.ly", "score_partial.png"]
 
     while True:
         action = get_welcome_screen(screen)
@@ -51,7 +66,7 @@ def main():
                                         # Random cycling through chord types
                                         while True:
                                             # Get a random chord type for each phrase
-                                            current_chord_type = random_7sus4_cycler.get_next_chord_type()
+                                            current_chord_type = session.next_chord_type()
                                             # Create composite phrase type
                                             if length_selection == "7sus4":
                                                 final_phrase_type = current_chord_type
@@ -59,7 +74,7 @@ def main():
                                                 final_phrase_type = "long_" + current_chord_type
                                             else:
                                                 final_phrase_type = length_selection
-                                            continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, temp_files, use_random_cycling=True)
+                                            continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, use_random_cycling=True, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                             if not continue_loop:
                                                 break
                                             # If phrase generator returns True, break out of random cycling to go back to length selection
@@ -92,7 +107,7 @@ def main():
                                             final_phrase_type = "long_" + chord_type_selection
                                         else:
                                             final_phrase_type = length_selection
-                                        continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, temp_files)
+                                        continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                         if not continue_loop:
                                             break
                                         # If phrase generator returns True, go back to length selection
@@ -115,13 +130,13 @@ def main():
                                 break
                             if length_selection == "back_to_phrase_type":
                                 continue
-                            continue_loop, next_screen = run_phrase_generator(screen, length_selection, temp_files)
+                            continue_loop, next_screen = run_phrase_generator(screen, length_selection, session=session, renderer=args.renderer, reveal=args.reveal_every)
                             if not continue_loop:
                                 break
                             if next_screen:
                                 continue
                         else:
-                            continue_loop, next_screen = run_phrase_generator(screen, phrase_type, temp_files)
+                            continue_loop, next_screen = run_phrase_generator(screen, phrase_type, session=session, renderer=args.renderer, reveal=args.reveal_every)
                             if not continue_loop:
                                 break
                             if next_screen:
@@ -160,7 +175,7 @@ def main():
                                             # Random cycling through chord types
                                             while True:
                                                 # Get a random chord type for each phrase
-                                                current_chord_type = random_7sus4_cycler.get_next_chord_type()
+                                                current_chord_type = session.next_chord_type()
                                                 # Create composite phrase type
                                                 if length_selection == "7sus4":
                                                     final_phrase_type = current_chord_type
@@ -168,7 +183,7 @@ def main():
                                                     final_phrase_type = "long_" + current_chord_type
                                                 else:
                                                     final_phrase_type = length_selection
-                                                continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, temp_files, key=selected_key, use_random_cycling=True)
+                                                continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, key=selected_key, use_random_cycling=True, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                                 if not continue_loop:
                                                     break
                                                 # If phrase generator returns True, break out of random cycling to go back to length selection
@@ -201,7 +216,7 @@ def main():
                                                 final_phrase_type = "long_" + chord_type_selection
                                             else:
                                                 final_phrase_type = length_selection
-                                            continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, temp_files, key=selected_key)
+                                            continue_loop, next_screen = run_phrase_generator(screen, final_phrase_type, key=selected_key, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                             if not continue_loop:
                                                 break
                                             # If phrase generator returns True, go back to length selection
@@ -224,13 +239,13 @@ def main():
                                     break
                                 if length_selection == "back_to_phrase_type":
                                     continue
-                                continue_loop, next_screen = run_phrase_generator(screen, length_selection, temp_files, key=selected_key)
+                                continue_loop, next_screen = run_phrase_generator(screen, length_selection, key=selected_key, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                 if not continue_loop:
                                     break
                                 if next_screen:
                                     continue
                             else:
-                                continue_loop, next_screen = run_phrase_generator(screen, phrase_type, temp_files, key=selected_key)
+                                continue_loop, next_screen = run_phrase_generator(screen, phrase_type, key=selected_key, session=session, renderer=args.renderer, reveal=args.reveal_every)
                                 if not continue_loop:
                                     break
                                 if next_screen:
@@ -241,7 +256,9 @@ def main():
                     break
 
     pygame.quit()
-    cleanup_files(temp_files)
+    if args.record:
+        session.save(args.record)
+        print(f"Session saved to {args.record}")
     print("Program closed.")
 
 if __name__ == "__main__":
@@ -1,27 +1,33 @@
 import random
-from constants import LILYPOND_PITCHES, PITCH_CLASSES_SHARP, PITCH_CLASSES_FLAT, FLAT_KEYS, KEYS
+from spelling import spell
+
+# Notes are handled internally as MIDI numbers (C4 = 60); note names such as
+# "Bb4" are only parsed when cells are loaded and produced again for display
+PITCH_CLASS_NUMBERS = {"C": 0, "Db": 1, "C#": 1, "D": 2, "Eb": 3, "D#": 3, "E": 4,
+                       "F": 5, "Gb": 6, "F#": 6, "G": 7, "Ab": 8, "G#": 8, "A": 9,
+                       "Bb": 10, "A#": 10, "B": 11}
 
 def note_to_pitch(note):
-    pitch_classes = {"C": 0, "Db": 1, "C#": 1, "D": 2, "Eb": 3, "D#": 3, "E": 4,
-                     "F": 5, "Gb": 6, "F#": 6, "G": 7, "Ab": 8, "G#": 8, "A": 9,
-                     "Bb": 10, "A#": 10, "B": 11}
     name, octave = note[:-1], int(note[-1])
-    return pitch_classes[name], octave
+    return PITCH_CLASS_NUMBERS[name], octave
 
-def transpose_note(note, semitones, key):
+def note_to_midi(note):
     pitch_class, octave = note_to_pitch(note)
-    new_pitch = (pitch_class + semitones) % 12
-    new_octave = octave + ((pitch_class + semitones) // 12)
-    pitch_classes = PITCH_CLASSES_SHARP if key not in FLAT_KEYS else PITCH_CLASSES_FLAT
-    pitch_name = pitch_classes[new_pitch]
-    if key in ["F#", "B", "E", "A", "D", "G"]:
-        if pitch_name in ["Db", "Eb", "Gb", "Ab", "Bb"]:
-            pitch_name = {1: "C#", 3: "D#", 6: "F#", 8: "G#", 10: "A#"}.get(new_pitch, pitch_name)
-    return f"{pitch_name}{new_octave}"
+    return pitch_class + (octave + 1) * 12
+
+def cells_to_midi(cells):
+    """Convert cells written as note names into tuples of MIDI numbers"""
+    return [tuple(note_to_midi(note) for note in cell) for cell in cells]
+
+def transpose_cells(cells, semitones):
+    return [tuple(note + semitones for note in cell) for cell in cells]
+
+def transpose_note(note, semitones, key):
+    return spell(note_to_midi(note) + semitones, key)
 
 def adjust_right_cell(left_cell, right_cell):
-    left_end_pitch, left_end_octave = note_to_pitch(left_cell[-1])
-    right_start_pitch, right_start_octave = note_to_pitch(right_cell[0])
+    left_end_pitch, left_end_octave = left_cell[-1] % 12, left_cell[-1] // 12
+    right_start_pitch, right_start_octave = right_cell[0] % 12, right_cell[0] // 12
     
     # Calculate octave shift based on the last note of the left cell and the first note of the right cell
     if left_end_pitch == right_start_pitch:
@@ -34,27 +40,20 @@ def adjust_right_cell(left_cell, right_cell):
         else:
             octave_shift = left_end_octave - right_start_octave
     
-    adjusted_right = []
-    for note in right_cell:
-        pitch_class, octave = note_to_pitch(note)
-        new_octave = octave + octave_shift
-        for key in LILYPOND_PITCHES:
-            if note_to_pitch(key) == (pitch_class, new_octave):
-                adjusted_right.append(key)
-                break
-    return adjusted_right
+    return tuple(note + octave_shift * 12 for note in right_cell)
 
 
 class Cycler:
-    def __init__(self, items):
+    def __init__(self, items, rng=random):
         self.original_items = items
+        self.rng = rng
         self.permutation = []
         self.index = 0
         self.reset_permutation()
 
     def reset_permutation(self):
         self.permutation = list(range(len(self.original_items)))
-        random.shuffle(self.permutation)
+        self.rng.shuffle(self.permutation)
         self.index = 0
 
     def next_item(self):
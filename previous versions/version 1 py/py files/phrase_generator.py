@@ -1,30 +1,15 @@
 import random
-from data import CELLS, MAJOR_CELLS, MAJOR_RESOLUTION_CELLS, CELLS2, minor_B_cells, minor_C_cells, CELLSM5, minor_C_cells_down2, turnaround_cells_1, DFB, CELLS_up5, CELLS_up2, CELLS_down5
-from constants import LILYPOND_PITCHES, KEYS
-from music_utils import Cycler, adjust_right_cell, transpose_note, note_to_pitch
-
-def get_dominant_or_relative_major_key(phrase_type, selected_key):
-    """Map a selected key to the effective key for phrase generation."""
-    # For minor progressions, map to relative major
-    minor_to_relative_major = {
-        "A": "C",  # A minor -> C major
-        "D": "F#",
-        "G": "B",
-        "C": "E",
-        "F": "A",
-        "Bb": "D",
-        "Eb": "G",
-        "Ab": "C",
-        "Db": "F#",
-        "F#": "A",
-        "B": "D",
-        "E": "G"
-    }
-    
-    if phrase_type in ["short_25_minor", "long_25_minor"]:
-        return minor_to_relative_major.get(selected_key, selected_key)
-    # For other phrase types, return the selected key as is
-    return selected_key
+from data import CELL_STORE, PHRASE_CHAINS
+from constants import KEYS
+from music_utils import adjust_right_cell
+from spelling import spell
+from chain_sampler import ChainSampler
+
+# One sampler per phrase type, built once at import
+CHAIN_SAMPLERS = {
+    phrase_type: ChainSampler(CELL_STORE, resolution_set, cell_sets)
+    for phrase_type, (resolution_set, cell_sets) in PHRASE_CHAINS.items()
+}
 
 def generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type):
     """Generate a musical phrase (placeholder implementation)."""
@@ -49,385 +34,102 @@ def generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type):
     return phrase, key, phrase_length
 
 
+# Cell set every phrase type's resolution cell must come from
+RESOLUTION_SETS = {
+    "short_25_major": "MAJOR_RESOLUTION_CELLS",
+    "long_25_major": "MAJOR_RESOLUTION_CELLS",
+    "turnaround": "MAJOR_RESOLUTION_CELLS",
+    "short_25_minor": "minor_C_cells",
+    "long_25_minor": "minor_C_cells",
+    "rhythm_changes_56": "DFB",
+    "ii7_to_v7": "CELLS_down5",
+}
+
 def validate_resolution_cell(phrase, phrase_type):
     """Ensure resolution cell matches database, preserving original pitch classes and octaves."""
-    if phrase_type in ["short_25_major", "long_25_major", "turnaround"]:
-        resolution_cell = phrase[-5:]
-        resolution_cell_str = " ".join(resolution_cell)
-        
-        for cell in MAJOR_RESOLUTION_CELLS:
-            cell_str = " ".join(cell)
-            if resolution_cell_str == cell_str:
-                return phrase
-        
-        resolution_pitch_classes = [note[:-1] for note in resolution_cell]
-        for cell in MAJOR_RESOLUTION_CELLS:
-            cell_pitch_classes = [note[:-1] for note in cell]
-            if cell_pitch_classes == resolution_pitch_classes:
-                adjusted_cell = []
-                ref_octave = note_to_pitch(resolution_cell[0])[1]
-                for i, note in enumerate(cell):
-                    pitch_class, octave = note_to_pitch(note)
-                    new_octave = ref_octave + (note_to_pitch(cell[i])[1] - note_to_pitch(cell[0])[1])
-                    for key in LILYPOND_PITCHES:
-                        if note_to_pitch(key) == (pitch_class, new_octave):
-                            adjusted_cell.append(key)
-                            break
-                phrase = phrase[:-5] + adjusted_cell
-                return phrase
-    elif phrase_type in ["short_25_minor", "long_25_minor"]:
-        resolution_cell = phrase[-5:]
-        resolution_cell_str = " ".join(resolution_cell)
-        
-        for cell in minor_C_cells:
-            cell_str = " ".join(cell)
-            if resolution_cell_str == cell_str:
-                return phrase
-        
-        resolution_pitch_classes = [note[:-1] for note in resolution_cell]
-        for cell in minor_C_cells:
-            cell_pitch_classes = [note[:-1] for note in cell]
-            if cell_pitch_classes == resolution_pitch_classes:
-                adjusted_cell = []
-                ref_octave = note_to_pitch(resolution_cell[0])[1]
-                for i, note in enumerate(cell):
-                    pitch_class, octave = note_to_pitch(note)
-                    new_octave = ref_octave + (note_to_pitch(cell[i])[1] - note_to_pitch(cell[0])[1])
-                    for key in LILYPOND_PITCHES:
-                        if note_to_pitch(key) == (pitch_class, new_octave):
-                            adjusted_cell.append(key)
-                            break
-                phrase = phrase[:-5] + adjusted_cell
-                return phrase
-    elif phrase_type == "rhythm_changes_56":
-        resolution_cell = phrase[-5:]
-        resolution_cell_str = " ".join(resolution_cell)
-        
-        for cell in DFB:
-            cell_str = " ".join(cell)
-            if resolution_cell_str == cell_str:
-                return phrase
-        
-        resolution_pitch_classes = [note[:-1] for note in resolution_cell]
-        for cell in DFB:
-            cell_pitch_classes = [note[:-1] for note in cell]
-            if cell_pitch_classes == resolution_pitch_classes:
-                adjusted_cell = []
-                ref_octave = note_to_pitch(resolution_cell[0])[1]
-                for i, note in enumerate(cell):
-                    pitch_class, octave = note_to_pitch(note)
-                    new_octave = ref_octave + (note_to_pitch(cell[i])[1] - note_to_pitch(cell[0])[1])
-                    for key in LILYPOND_PITCHES:
-                        if note_to_pitch(key) == (pitch_class, new_octave):
-                            adjusted_cell.append(key)
-                            break
-                phrase = phrase[:-5] + adjusted_cell
-                return phrase
-    elif phrase_type == "ii7_to_v7":
-        resolution_cell = phrase[-5:]
-        resolution_cell_str = " ".join(resolution_cell)
-        
-        for cell in CELLS_down5:
-            cell_str = " ".join(cell)
-            if resolution_cell_str == cell_str:
-                return phrase
-        
-        resolution_pitch_classes = [note[:-1] for note in resolution_cell]
-        for cell in CELLS_down5:
-            cell_pitch_classes = [note[:-1] for note in cell]
-            if cell_pitch_classes == resolution_pitch_classes:
-                adjusted_cell = []
-                ref_octave = note_to_pitch(resolution_cell[0])[1]
-                for i, note in enumerate(cell):
-                    pitch_class, octave = note_to_pitch(note)
-                    new_octave = ref_octave + (note_to_pitch(cell[i])[1] - note_to_pitch(cell[0])[1])
-                    for key in LILYPOND_PITCHES:
-                        if note_to_pitch(key) == (pitch_class, new_octave):
-                            adjusted_cell.append(key)
-                            break
-                phrase = phrase[:-5] + adjusted_cell
-                return phrase
-    
-    return phrase
-
-def generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type="7sus4"):
-    def build_long_major_phrase(key_name):
-        max_attempts = 100
-        attempts = 0
-        
-        while attempts < max_attempts:
-            phrase = right_cycler.next_item()  # Start with a major cell
-            cell_sets = [MAJOR_CELLS, MAJOR_CELLS, MAJOR_CELLS]  # Three additional cells
-            valid_phrase = True
-            
-            for cell_set in cell_sets:
-                first_note_current = phrase[0][:-1]
-                compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-                
-                if not compatible_cells:
-                    valid_phrase = False
-                    break
-                
-                left_cell = Cycler(compatible_cells).next_item()
-                adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-                phrase = left_cell[:-1] + adjusted_new_cell
-            
-            if valid_phrase and len(phrase) == 17:  # Expected length: 5 + 4 + 4 + 4
-                return phrase, len(phrase), key_name
-            
-            attempts += 1
-            right_cycler.reset_permutation()
-        
-        raise ValueError("Failed to generate a valid long_major phrase after maximum attempts")
-
-    def build_long_7sus4_phrase(key_name):
-        max_attempts = 100
-        attempts = 0
-        
-        while attempts < max_attempts:
-            phrase = right_cycler.next_item()  # Start with a 7sus4 cell
-            cell_sets = [CELLS, CELLS, CELLS]  # Three additional cells
-            valid_phrase = True
-            
-            for cell_set in cell_sets:
-                first_note_current = phrase[0][:-1]
-                compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-                
-                if not compatible_cells:
-                    valid_phrase = False
-                    break
-                
-                left_cell = Cycler(compatible_cells).next_item()
-                adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-                phrase = left_cell[:-1] + adjusted_new_cell
-            
-            if valid_phrase and len(phrase) == 17:  # Expected length: 5 + 4 + 4 + 4
-                return phrase, len(phrase), key_name
-            
-            attempts += 1
-            right_cycler.reset_permutation()
-        
-        raise ValueError("Failed to generate a valid long_7sus4 phrase after maximum attempts")
-
-    def build_ii7_to_v7_phrase(key_name):
-        max_attempts = 100
-        attempts = 0
-        
-        while attempts < max_attempts:
-            resolution_cell = right_cycler.next_item()
-            phrase = resolution_cell
-            cell_sets = [CELLS_down5, CELLS_up2, CELLS_up2]
-            valid_phrase = True
-            
-            for cell_set in cell_sets:
-                first_note_current = phrase[0][:-1]
-                compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-                
-                if not compatible_cells:
-                    valid_phrase = False
-                    break
-                
-                left_cell = Cycler(compatible_cells).next_item()
-                adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-                phrase = left_cell[:-1] + adjusted_new_cell
-            
-            if valid_phrase and len(phrase) == 17:
-                return phrase, len(phrase), key_name
-            
-            attempts += 1
-            right_cycler.reset_permutation()
-        
-        raise ValueError("Failed to generate a valid ii7_to_v7 phrase after maximum attempts")
-
-    def build_rhythm_changes_56_phrase(key_name):
-        max_attempts = 100
-        attempts = 0
-        
-        while attempts < max_attempts:
-            resolution_cell = right_cycler.next_item()
-            phrase = resolution_cell
-            cell_sets = [CELLS_up5, CELLS, CELLS]
-            valid_phrase = True
-            
-            for cell_set in cell_sets:
-                first_note_current = phrase[0][:-1]
-                compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-                
-                if not compatible_cells:
-                    valid_phrase = False
-                    break
-                
-                left_cell = Cycler(compatible_cells).next_item()
-                adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-                phrase = left_cell[:-1] + adjusted_new_cell
-            
-            if valid_phrase and len(phrase) == 17:
-                phrase = validate_resolution_cell(phrase, phrase_type)
-                return phrase, len(phrase), key_name
-            
-            attempts += 1
-            right_cycler.reset_permutation()
-        
-        raise ValueError("Failed to generate a valid rhythm_changes_56 phrase after maximum attempts")
-
-    key_name = key_cycler.next_item()
-
-    if phrase_type == "7sus4":
-        cell_set = CELLS
-        left_cell = left_cycler.next_item()
-        last_note_left = left_cell[-1][:-1]
-        compatible_right = [cell for cell in cell_set if cell[0][:-1] == last_note_left]
-        
-        if compatible_right:
-            right_cell = right_cycler.next_item()
-            while right_cell[0][:-1] != last_note_left:
-                right_cell = right_cycler.next_item()
-        else:
-            right_cell = right_cycler.next_item()
-        
-        adjusted_right = adjust_right_cell(left_cell, right_cell)
-        phrase = left_cell + adjusted_right[1:]
-        phrase_length = len(phrase)
-
-    elif phrase_type == "major":
-        cell_set = MAJOR_CELLS
-        left_cell = left_cycler.next_item()
-        last_note_left = left_cell[-1][:-1]
-        compatible_right = [cell for cell in cell_set if cell[0][:-1] == last_note_left]
-        
-        if compatible_right:
-            right_cell = right_cycler.next_item()
-            while right_cell[0][:-1] != last_note_left:
-                right_cell = right_cycler.next_item()
-        else:
-            right_cell = right_cycler.next_item()
-        
-        adjusted_right = adjust_right_cell(left_cell, right_cell)
-        phrase = left_cell + adjusted_right[1:]
-        phrase_length = len(phrase)
-
-    elif phrase_type == "long_major":
-        phrase, phrase_length, key_name = build_long_major_phrase(key_name)
-
-    elif phrase_type == "long_7sus4":
-        phrase, phrase_length, key_name = build_long_7sus4_phrase(key_name)
-
-    elif phrase_type == "short_25_major":
-        right_cell = right_cycler.next_item()
-        first_note_right = right_cell[0][:-1]
-        compatible_left = [cell for cell in CELLS2 if cell[-1][:-1] == first_note_right]
-        
-        if compatible_left:
-            left_cell = left_cycler.next_item()
-            attempts = 0
-            while left_cell[-1][:-1] != first_note_right and attempts < len(CELLS2):
-                left_cell = left_cycler.next_item()
-                attempts += 1
-            if attempts >= len(CELLS2):
-                left_cell = compatible_left[0]
-        
-        adjusted_right = adjust_right_cell(left_cell, right_cell)
-        phrase = left_cell + adjusted_right[1:]
-        phrase_length = len(phrase)
-
-    elif phrase_type == "long_25_major":
-        resolution_cell = right_cycler.next_item()
-        phrase = resolution_cell
-        cell_sets = [CELLS2, CELLS, CELLS]
-        
-        for cell_set in cell_sets:
-            first_note_current = phrase[0][:-1]
-            dominant_compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-            
-            if dominant_compatible_cells:
-                left_cell = Cycler(dominant_compatible_cells).next_item()
-            else:
-                return generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type)
-            
-            adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-            phrase = left_cell[:-1] + adjusted_new_cell
-        
-        phrase_length = len(phrase)
-
-    elif phrase_type == "short_25_minor":
-        right_cell = right_cycler.next_item()
-        first_note_right = right_cell[0][:-1]
-        compatible_left = [cell for cell in minor_B_cells if cell[-1][:-1] == first_note_right]
-        
-        if compatible_left:
-            left_cell = left_cycler.next_item()
-            attempts = 0
-            while left_cell[-1][:-1] != first_note_right and attempts < len(minor_B_cells):
-                left_cell = left_cycler.next_item()
-                attempts += 1
-            if attempts >= len(minor_B_cells):
-                left_cell = compatible_left[0]
-        
-        adjusted_right = adjust_right_cell(left_cell, right_cell)
-        phrase = left_cell + adjusted_right[1:]
-        phrase_length = len(phrase)
-
-    elif phrase_type == "long_25_minor":
-        resolution_cell = right_cycler.next_item()
-        phrase = resolution_cell
-        cell_sets = [minor_B_cells, CELLSM5, CELLSM5]
-        
-        for cell_set in cell_sets:
-            first_note_current = phrase[0][:-1]
-            compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-            
-            if compatible_cells:
-                left_cell = Cycler(compatible_cells).next_item()
-            else:
-                return generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type)
-            
-            adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-            phrase = left_cell[:-1] + adjusted_new_cell
-        
-        phrase_length = len(phrase)
-
-    elif phrase_type == "turnaround":
-        max_attempts = 100
-        attempts = 0
-        
-        while attempts < max_attempts:
-            resolution_cell = right_cycler.next_item()
-            phrase = resolution_cell
-            cell_sets = [CELLS2, minor_C_cells_down2, turnaround_cells_1]
-            valid_phrase = True
-            
-            for cell_set in cell_sets:
-                first_note_current = phrase[0][:-1]
-                compatible_cells = [cell for cell in cell_set if cell[-1][:-1] == first_note_current]
-                
-                if not compatible_cells:
-                    valid_phrase = False
-                    break
-                
-                left_cell = Cycler(compatible_cells).next_item()
-                adjusted_new_cell = adjust_right_cell(left_cell, phrase)
-                phrase = left_cell[:-1] + adjusted_new_cell
-            
-            if valid_phrase and len(phrase) == 17:
-                phrase = validate_resolution_cell(phrase, phrase_type)
-                break
-            
-            attempts += 1
-            right_cycler.reset_permutation()
-
-        else:
-            raise ValueError("Failed to generate a valid turnaround phrase after maximum attempts")
-
-    elif phrase_type == "rhythm_changes_56":
-        phrase, phrase_length, key_name = build_rhythm_changes_56_phrase(key_name)
-
-    elif phrase_type == "ii7_to_v7":
-        phrase, phrase_length, key_name = build_ii7_to_v7_phrase(key_name)
-    
+    set_name = RESOLUTION_SETS.get(phrase_type)
+    if set_name is None:
+        return phrase
+    resolution_cell = tuple(phrase[-5:])
+    cell = CELL_STORE.matching_cell(set_name, resolution_cell)
+    if cell is None or cell == resolution_cell:
+        return phrase
+    octave_shift = resolution_cell[0] // 12 - cell[0] // 12
+    adjusted_cell = tuple(note + octave_shift * 12 for note in cell)
+    return tuple(phrase[:-5]) + adjusted_cell
+
+def get_phrase_semitones(phrase_type, key_name):
+    """Transposition applied to the C phrase for the given key"""
     key_semitones = KEYS[key_name]
     if phrase_type == "turnaround":
         key_semitones = (key_semitones + 7) % 12
-    transposed_phrase = [transpose_note(note, key_semitones, key_name) for note in phrase]
-    transposed_phrase = validate_resolution_cell(transposed_phrase, phrase_type)
+    return key_semitones
+
+def build_chain_phrase(phrase_type, key_semitones, rng=random, rounds=None):
+    """Build a phrase from a chain drawn uniformly over every valid chain that fits the range in the target key
+    (or in shuffled rounds, see ChainSampler.sample)"""
+    chain = CHAIN_SAMPLERS[phrase_type].sample(key_semitones, rng, rounds)
+    phrase = chain[-1]
+    for left_cell in reversed(chain[:-1]):
+        adjusted_new_cell = adjust_right_cell(left_cell, phrase)
+        phrase = left_cell[:-1] + adjusted_new_cell
+    return phrase
+
+def build_transposed_phrase(phrase_type, key_semitones, rng=random, rounds=None):
+    """Sample, validate and transpose one phrase, as a tuple of MIDI numbers"""
+    phrase = build_chain_phrase(phrase_type, key_semitones, rng, rounds)
+    if phrase_type in ["turnaround", "rhythm_changes_56"]:
+        phrase = validate_resolution_cell(phrase, phrase_type)
+
+    transposed_phrase = tuple(note + key_semitones for note in phrase)
+    return validate_resolution_cell(transposed_phrase, phrase_type)
+
+def generate_phrases(phrase_type, n, keys=None, seed=None, rng=None):
+    """Generate n validated, in-range phrases of one type in a single call.
+
+    Returns a list of (key_name, notes) tuples, where notes is a tuple of MIDI
+    numbers (spelling.spell(note, key_name) gives the note names). Each
+    phrase gets a key drawn from keys (every key in KEYS by default), leaving
+    out keys in which the phrase type can never fit the range. The same seed
+    always gives the same batch; pass rng instead to draw from an existing
+    stream. Nothing is printed.
+    """
+    if phrase_type not in CHAIN_SAMPLERS:
+        raise ValueError(f"Unknown phrase type: {phrase_type}")
+    sampler = CHAIN_SAMPLERS[phrase_type]
+    if rng is None:
+        rng = random.Random(seed)
+
+    keys = list(KEYS) if keys is None else list(keys)
+    key_plan = [(key_name, get_phrase_semitones(phrase_type, key_name)) for key_name in keys]
+    key_plan = [(key_name, key_semitones) for key_name, key_semitones in key_plan if sampler.is_feasible(key_semitones)]
+    if not key_plan:
+        raise ValueError(f"No {phrase_type} phrase fits the F3-E5 range in any of the keys {', '.join(keys)}")
+
+    batch = []
+    for _ in range(n):
+        key_name, key_semitones = rng.choice(key_plan)
+        batch.append((key_name, build_transposed_phrase(phrase_type, key_semitones, rng)))
+    return batch
+
+def generate_phrase(left_cycler, right_cycler, key_cycler, phrase_type="7sus4", rng=random, rounds=None):
+    if phrase_type not in CHAIN_SAMPLERS:
+        raise ValueError(f"Unknown phrase type: {phrase_type}")
+    sampler = CHAIN_SAMPLERS[phrase_type]
+
+    # Skip keys in which no phrase of this type fits the range
+    for _ in range(len(key_cycler.original_items)):
+        key_name = key_cycler.next_item()
+        key_semitones = get_phrase_semitones(phrase_type, key_name)
+        if sampler.is_feasible(key_semitones):
+            break
+    else:
+        raise ValueError(f"No {phrase_type} phrase fits the F3-E5 range in the key of {key_name}"
+                         if len(key_cycler.original_items) == 1 else
+                         f"No {phrase_type} phrase fits the F3-E5 range in any key")
+
+    transposed_phrase = build_transposed_phrase(phrase_type, key_semitones, rng, rounds)
+    # Note names are only produced here, for the score and the display
+    transposed_phrase = [spell(note, key_name) for note in transposed_phrase]
     print(f"Phrase type: {phrase_type}, key_name={key_name}, transposed_phrase={' '.join(transposed_phrase)}")
-    return transposed_phrase, key_name, len(phrase)
\ No newline at end of file
+    return transposed_phrase, key_name, len(transposed_phrase)
\ No newline at end of file
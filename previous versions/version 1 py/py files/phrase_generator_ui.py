@@ -1,27 +1,21 @@
+import io
+import time
 import pygame
-from data import CELLS, CELLS2, MAJOR_CELLS, MAJOR_RESOLUTION_CELLS, KEYS, KEY_CHORD_MAP, minor_B_cells, minor_C_cells, minor_C_cells_down2, turnaround_cells_1, DFB, CELLS_up5, CELLS_up2, CELLS_down5, find_7sus4_generation_key, find_7sus4_target_key_for_display, get_7sus4_chord_display
-from random_cycler import random_7sus4_cycler
-from music_utils import Cycler, note_to_pitch
-from phrase_generator import generate_phrase
-from score_generator import generate_score_png, generate_partial_score_png, cleanup_files
+from data import KEYS, KEY_CHORD_MAP, find_7sus4_target_key_for_display, get_7sus4_chord_display
+from session import Session, PhraseDeck
+from phrase_prefetcher import PhrasePrefetcher
+from score_generator import REVEAL_EVERY, build_reveal_source, render_reveal, score_key
+from render_cache import MemoryCache
+from text_cache import render_text
+from ui import Page, draw_button, draw_return_arrow, draw_footer_text
+from staff_renderer import render_surfaces
 from constants import KEYS
 
-def get_dominant_or_relative_major_key(phrase_type, tonic_key):
-    """Map the tonic key to the dominant (for major 25) or relative major (for minor 25), or use tonic key directly."""
-    if tonic_key not in KEYS:
-        raise KeyError(f"Invalid tonic key: {tonic_key}")
-    key_semitones = KEYS[tonic_key]
-    if phrase_type in ["short_25_major", "long_25_major"]:
-        dominant_semitones = (key_semitones + 7) % 12
-        for key, semitones in KEYS.items():
-            if semitones == dominant_semitones:
-                return key
-    elif phrase_type in ["short_25_minor", "long_25_minor"]:
-        relative_major_semitones = (key_semitones + 3) % 12
-        for key, semitones in KEYS.items():
-            if semitones == relative_major_semitones:
-                return key
-    return tonic_key
+# Score backends: LilyPond engraving, or the built-in staff renderer
+SCORE_RENDERERS = ["lilypond", "native"]
+
+# Decoded (partial, full) score surfaces by the render cache key of their source
+SCORE_SURFACES = MemoryCache(64)
 
 def get_major_25_chord_progression(key):
     """Return the chord progression for Major 25 in the given key"""
@@ -193,45 +187,6 @@ def get_ii7_to_v7_chord_progression(key):
         return f"{ii_key}7 - {v_key}7 -"
     return f"in the key of {key}"
 
-def draw_button(screen, text, x, y, width, height, color, text_color):
-    pygame.draw.rect(screen, color, (x, y, width, height))
-    
-    # Start with the default font size
-    font_size = 36
-    font = pygame.font.Font(None, font_size)
-    text_surface = font.render(text, True, text_color)
-    text_rect = text_surface.get_rect()
-    
-    # If the text is too wide for the button, reduce the font size
-    while text_rect.width > width - 20 and font_size > 16:  # Keep minimum font size at 16
-        font_size -= 2
-        font = pygame.font.Font(None, font_size)
-        text_surface = font.render(text, True, text_color)
-        text_rect = text_surface.get_rect()
-    
-    # Center the text on the button
-    text_rect.center = (x + width // 2, y + height // 2)
-    screen.blit(text_surface, text_rect)
-    
-    return pygame.Rect(x, y, width, height)
-
-def draw_return_arrow(screen):
-    x, y = 950, 550
-    width, height = 40, 40
-    color = (200, 200, 200)
-    pygame.draw.rect(screen, color, (x, y, width, height))
-    pygame.draw.line(screen, (0, 0, 0), (x + 30, y + 10), (x + 10, y + 20), 2)
-    pygame.draw.line(screen, (0, 0, 0), (x + 10, y + 20), (x + 30, y + 30), 2)
-    pygame.draw.line(screen, (0, 0, 0), (x + 30, y + 10), (x + 30, y + 30), 2)
-    return pygame.Rect(x, y, width, height)
-
-def draw_footer_text(screen):
-    font = pygame.font.Font(None, 24)
-    text1 = font.render("Made by tsy", True, (0, 0, 0))
-    text2 = font.render("Contact: tungsyauy@gmail.com", True, (0, 0, 0))
-    screen.blit(text1, (10, 550))
-    screen.blit(text2, (10, 570))
-
 def map_random_key_for_display(phrase_type, generated_key):
     """
     Map the randomly generated key to the correct key for display purposes.
@@ -271,377 +226,185 @@ def map_random_key_for_display(phrase_type, generated_key):
     
     return generated_key
 
-def run_phrase_generator(screen, phrase_type, temp_files, key=None, use_random_cycling=False):
-    clock = pygame.time.Clock()
-    font = pygame.font.Font(None, 36)
+def get_display_text(phrase_type, selected_key, generated_key):
+    """Chord progression or key shown under the score"""
+    chord_map_key = phrase_type if phrase_type in KEY_CHORD_MAP else "major"
+    if selected_key:
+        if phrase_type in ["short_25_major", "long_25_major"]:
+            return get_major_25_chord_progression(selected_key)
+        elif phrase_type in ["short_25_minor", "long_25_minor"]:
+            return get_minor_25_chord_progression(selected_key)
+        elif phrase_type == "turnaround":
+            return get_turnaround_chord_progression(selected_key)
+        elif phrase_type == "rhythm_changes_56":
+            return get_rhythm_changes_56_chord_progression(selected_key)
+        elif phrase_type == "ii7_to_v7":
+            return get_ii7_to_v7_chord_progression(selected_key)
+        elif phrase_type in ["long_major", "major"]:
+            return f"in the key of {selected_key}"
+        elif phrase_type in ["long_7sus4", "7sus4"]:
+            return KEY_CHORD_MAP["7sus4"][selected_key]
+        elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
+            return KEY_CHORD_MAP["7sus4_minor"][selected_key]
+        elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
+            return KEY_CHORD_MAP["7sus4_dominant"][selected_key]
+        elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
+            return KEY_CHORD_MAP["7sus4_half_dim"][selected_key]
+        elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
+            return KEY_CHORD_MAP["7sus4_altered"][selected_key]
+        return KEY_CHORD_MAP[chord_map_key][selected_key]
 
-    # Initialize cyclers
-    if phrase_type in ["short_25_minor", "long_25_minor"]:
-        left_cycler = Cycler(minor_B_cells)
-        right_cycler = Cycler(minor_C_cells)
+    # For random mode, use the correct chord progressions with mapping
+    if phrase_type in ["7sus4", "long_7sus4"]:
+        return KEY_CHORD_MAP["7sus4"][generated_key]
+    elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
+        target_key = find_7sus4_target_key_for_display(generated_key, "minor")
+        return get_7sus4_chord_display(target_key, "minor")
+    elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
+        target_key = find_7sus4_target_key_for_display(generated_key, "dominant")
+        return get_7sus4_chord_display(target_key, "dominant")
+    elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
+        target_key = find_7sus4_target_key_for_display(generated_key, "half_dim")
+        return get_7sus4_chord_display(target_key, "half_dim")
+    elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
+        target_key = find_7sus4_target_key_for_display(generated_key, "altered")
+        return get_7sus4_chord_display(target_key, "altered")
+    elif phrase_type in ["short_25_major", "long_25_major"]:
+        # Map the generated key to the correct display key
+        display_key = map_random_key_for_display(phrase_type, generated_key)
+        return get_major_25_chord_progression(display_key)
+    elif phrase_type in ["short_25_minor", "long_25_minor"]:
+        # Map the generated key to the correct display key
+        display_key = map_random_key_for_display(phrase_type, generated_key)
+        return get_minor_25_chord_progression(display_key)
     elif phrase_type == "turnaround":
-        left_cycler = Cycler(turnaround_cells_1)
-        right_cycler = Cycler(MAJOR_RESOLUTION_CELLS)
+        return get_turnaround_chord_progression(generated_key)
     elif phrase_type == "rhythm_changes_56":
-        left_cycler = Cycler(CELLS)
-        right_cycler = Cycler(DFB)
+        return get_rhythm_changes_56_chord_progression(generated_key)
     elif phrase_type == "ii7_to_v7":
-        left_cycler = Cycler(CELLS_up2)
-        right_cycler = Cycler(CELLS_down5)
-    elif phrase_type in ["major", "long_major"]:
-        left_cycler = Cycler(MAJOR_CELLS)
-        right_cycler = Cycler(MAJOR_CELLS)
-    elif phrase_type in ["7sus4", "long_7sus4", "7sus4_minor", "7sus4_dominant", "7sus4_half_dim", "7sus4_altered", 
-                         "long_7sus4_minor", "long_7sus4_dominant", "long_7sus4_half_dim", "long_7sus4_altered"]:
-        left_cycler = Cycler(CELLS)
-        right_cycler = Cycler(CELLS)
-    else:
-        cell_set = CELLS2 if phrase_type in ["short_25_major", "long_25_major"] else CELLS
-        left_cycler = Cycler(cell_set)
-        right_cycler = Cycler(MAJOR_RESOLUTION_CELLS if phrase_type in ["short_25_major", "long_25_major"] else cell_set)
+        return get_ii7_to_v7_chord_progression(generated_key)
+    return KEY_CHORD_MAP[chord_map_key][generated_key]
 
-    # Initialize resolution cycler
-    if phrase_type == "long_25_minor":
-        resolution_cycler = Cycler(minor_C_cells)
-    elif phrase_type in ["short_25_major", "long_25_major", "turnaround"]:
-        resolution_cycler = Cycler(MAJOR_RESOLUTION_CELLS)
-    elif phrase_type == "rhythm_changes_56":
-        resolution_cycler = Cycler(DFB)
-    elif phrase_type == "ii7_to_v7":
-        resolution_cycler = Cycler(CELLS_down5)
-    elif phrase_type in ["long_major", "long_7sus4", "long_7sus4_minor", "long_7sus4_dominant", "long_7sus4_half_dim", "long_7sus4_altered"]:
-        resolution_cycler = Cycler(MAJOR_CELLS if phrase_type == "long_major" else CELLS)
-    else:
-        resolution_cycler = None
+def load_svg(svg):
+    """Rasterize an SVG (sized by score_generator.svg_for_width) onto a white surface"""
+    image = pygame.image.load(io.BytesIO(svg.encode()), "score.svg")
+    surface = pygame.Surface(image.get_size())
+    surface.fill((255, 255, 255))
+    surface.blit(image, (0, 0))
+    return surface
 
-    # Initialize key cycler
-    key_cycler = Cycler(list(KEYS.keys()))
+def display_format(*surfaces):
+    """Standalone copies of the surfaces in the display's pixel format, so every frame blits them without conversion.
 
-    # Set expected phrase lengths
-    expected_lengths = {
-        "7sus4": 9,
-        "7sus4_minor": 9,
-        "7sus4_dominant": 9,
-        "7sus4_half_dim": 9,
-        "7sus4_altered": 9,
-        "major": 9,
-        "short_25_major": 9,
-        "long_25_major": 17,
-        "short_25_minor": 9,
-        "long_25_minor": 17,
-        "turnaround": 17,
-        "rhythm_changes_56": 17,
-        "ii7_to_v7": 17,
-        "long_major": 17,
-        "long_7sus4": 17,
-        "long_7sus4_minor": 17,
-        "long_7sus4_dominant": 17,
-        "long_7sus4_half_dim": 17,
-        "long_7sus4_altered": 17
-    }
+    Call it on the main thread: convert() works against the display surface.
+    """
+    if pygame.display.get_surface() is None:
+        return surfaces
+    return tuple(surface.convert() for surface in surfaces)
 
-    # Define pitch range (F3 to E5)
-    F3_PITCH = 5 + (2 * 12)
-    E5_PITCH = 4 + (6 * 12)
+def run_phrase_generator(screen, phrase_type, key=None, use_random_cycling=False, session=None, prefetch_depth=2, renderer="lilypond", reveal=REVEAL_EVERY):
+    if session is None:
+        session = Session()
+    deck = PhraseDeck(session, phrase_type, key, use_random_cycling)
+    selected_key = key
 
-    def is_phrase_in_range(phrase):
-        for note in phrase:
-            pitch_class, octave = note_to_pitch(note)
-            absolute_pitch = pitch_class + (octave * 12)
-            if absolute_pitch < F3_PITCH or absolute_pitch > E5_PITCH:
-                return False
-        return True
+    # Phrases are generated, engraved and rasterized on a background thread, a
+    # few ahead of the one on screen, into plain surfaces: show() converts them
+    # to the display format on the main thread. Scores seen before come from the
+    # render caches, already converted.
+    def prepare_next_phrase():
+        phrase_type, transposed_phrase, generated_key, _ = deck.next_phrase()
+        if renderer == "native":
+            start = time.perf_counter()
+            images = render_surfaces(transposed_phrase, reveal)
+            print(f"Rendered natively in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return phrase_type, transposed_phrase, generated_key, None, images, False
+        surface_key = score_key(build_reveal_source(transposed_phrase, reveal), output_format="svg")
+        images = SCORE_SURFACES.get(surface_key)
+        if images is not None:
+            return phrase_type, transposed_phrase, generated_key, surface_key, images, True
+        # Both scores come from one engraving, the partial one with the
+        # hidden notes switched off, rasterized SCORE_WIDTH wide
+        partial_svg, full_svg = render_reveal(transposed_phrase, reveal)
+        images = load_svg(partial_svg), load_svg(full_svg)
+        return phrase_type, transposed_phrase, generated_key, surface_key, images, False
 
-    # Initial phrase generation
-    selected_key = key
-    if selected_key:
-        # For chord-specific 7sus4 phrases, find the correct generation key
-        if phrase_type.startswith("7sus4_") or phrase_type.startswith("long_7sus4_"):
-            # Extract chord type from phrase type
-            if phrase_type.startswith("long_7sus4_"):
-                chord_type = phrase_type.replace("long_7sus4_", "")
-            else:
-                chord_type = phrase_type.replace("7sus4_", "")
-            effective_key = find_7sus4_generation_key(selected_key, chord_type)
-        else:
-            effective_key = get_dominant_or_relative_major_key(phrase_type, selected_key)
-        key_cycler = Cycler([effective_key])
-    key = key_cycler.next_item()
-    while True:
-        # Map new chord-specific phrase types to base types for generation
-        base_phrase_type = phrase_type
-        if phrase_type.startswith("7sus4_"):
-            base_phrase_type = "7sus4"
-        elif phrase_type.startswith("long_7sus4_"):
-            base_phrase_type = "long_7sus4"
-        
-        transposed_phrase, generated_key, phrase_length = generate_phrase(
-            left_cycler, 
-            right_cycler if base_phrase_type not in ["long_25_major", "long_25_minor", "turnaround", "rhythm_changes_56", "ii7_to_v7", "long_major", "long_7sus4"] else resolution_cycler, 
-            Cycler([key]), 
-            base_phrase_type
-        )
-        if (phrase_length == expected_lengths[phrase_type] and 
-            is_phrase_in_range(transposed_phrase)):
-            break
-        print(f"Generated phrase length {phrase_length} (expected {expected_lengths[phrase_type]}), "
-              f"pitch range {'valid' if is_phrase_in_range(transposed_phrase) else 'out of F3-E5 range'}, regenerating with key {key}...")
+    prefetcher = PhrasePrefetcher(prepare_next_phrase, prefetch_depth)
 
-    show_partial = True
-    try:
-        score_image_partial = generate_partial_score_png(transposed_phrase, phrase_length)
-        score_image_full = generate_score_png(transposed_phrase)
-        image_partial = pygame.image.load(score_image_partial)
-        image_full = pygame.image.load(score_image_full)
-        orig_width, orig_height = image_full.get_size()
-        aspect_ratio = orig_width / orig_height
-        target_width = 1000
-        target_height = int(target_width / aspect_ratio)
-        max_height = 560
-        if target_height > max_height:
-            target_height = max_height
-            target_width = int(target_height * aspect_ratio)
-        image_partial = pygame.transform.scale(image_partial, (target_width, target_height))
-        image_full = pygame.transform.scale(image_full, (target_width, target_height))
-        crop_factor = 0.85
-        crop_height = int(target_height * crop_factor)
-        image_partial = image_partial.subsurface((0, 0, target_width, crop_height))
-        image_full = image_full.subsurface((0, 0, target_width, crop_height))
-        new_height = crop_height
-        new_width = target_width
+    def finish(result):
+        prefetcher.close()
+        return result
+
+    def show(prepared):
+        phrase_type, transposed_phrase, generated_key, surface_key, images, converted = prepared
+        if not converted:
+            images = display_format(*images)
+            if surface_key is not None:
+                SCORE_SURFACES.put(surface_key, images)
+        image_partial, image_full = images
+        new_width, new_height = image_full.get_size()
         y_offset = (600 - new_height - 50) // 2 if (600 - new_height - 50) > 0 else 0
         x_offset = (1000 - new_width) // 2
-        chord_map_key = phrase_type if phrase_type in KEY_CHORD_MAP else "major"
-        if selected_key:
-            if phrase_type in ["short_25_major", "long_25_major"]:
-                display_text = get_major_25_chord_progression(selected_key)
-            elif phrase_type in ["short_25_minor", "long_25_minor"]:
-                display_text = get_minor_25_chord_progression(selected_key)
-            elif phrase_type == "turnaround":
-                display_text = get_turnaround_chord_progression(selected_key)
-            elif phrase_type == "rhythm_changes_56":
-                display_text = get_rhythm_changes_56_chord_progression(selected_key)
-            elif phrase_type == "ii7_to_v7":
-                display_text = get_ii7_to_v7_chord_progression(selected_key)
-            elif phrase_type in ["long_major", "major"]:
-                display_text = f"in the key of {selected_key}"
-            elif phrase_type in ["long_7sus4", "7sus4"]:
-                display_text = KEY_CHORD_MAP["7sus4"][selected_key]
-            elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
-                display_text = KEY_CHORD_MAP["7sus4_minor"][selected_key]
-            elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
-                display_text = KEY_CHORD_MAP["7sus4_dominant"][selected_key]
-            elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
-                display_text = KEY_CHORD_MAP["7sus4_half_dim"][selected_key]
-            elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
-                display_text = KEY_CHORD_MAP["7sus4_altered"][selected_key]
-            else:
-                display_text = KEY_CHORD_MAP[chord_map_key][selected_key]
-        else:
-            # For random mode, use the correct chord progressions with mapping
-            if phrase_type in ["7sus4", "long_7sus4"]:
-                display_text = KEY_CHORD_MAP["7sus4"][generated_key]
-            elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
-                target_key = find_7sus4_target_key_for_display(generated_key, "minor")
-                display_text = get_7sus4_chord_display(target_key, "minor")
-            elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
-                target_key = find_7sus4_target_key_for_display(generated_key, "dominant")
-                display_text = get_7sus4_chord_display(target_key, "dominant")
-            elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
-                target_key = find_7sus4_target_key_for_display(generated_key, "half_dim")
-                display_text = get_7sus4_chord_display(target_key, "half_dim")
-            elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
-                target_key = find_7sus4_target_key_for_display(generated_key, "altered")
-                display_text = get_7sus4_chord_display(target_key, "altered")
-            elif phrase_type in ["short_25_major", "long_25_major"]:
-                # Map the generated key to the correct display key
-                display_key = map_random_key_for_display(phrase_type, generated_key)
-                display_text = get_major_25_chord_progression(display_key)
-            elif phrase_type in ["short_25_minor", "long_25_minor"]:
-                # Map the generated key to the correct display key
-                display_key = map_random_key_for_display(phrase_type, generated_key)
-                display_text = get_minor_25_chord_progression(display_key)
-            elif phrase_type == "turnaround":
-                display_text = get_turnaround_chord_progression(generated_key)
-            elif phrase_type == "rhythm_changes_56":
-                display_text = get_rhythm_changes_56_chord_progression(generated_key)
-            elif phrase_type == "ii7_to_v7":
-                display_text = get_ii7_to_v7_chord_progression(generated_key)
-            else:
-                display_text = KEY_CHORD_MAP[chord_map_key][generated_key]
-        key_text = font.render(display_text, True, (0, 0, 0))
+        display_text = get_display_text(phrase_type, selected_key, generated_key)
+        key_text = render_text(display_text, 36, (0, 0, 0))
         key_y_position = y_offset + new_height + 30
         key_rect = key_text.get_rect(center=(1000 // 2, key_y_position))
         print(f"Key text y-position: {key_y_position}")
         print(f"Generated phrase: {' '.join(transposed_phrase)}, Display key: {display_text}, Selected key: {selected_key}, Generated key: {generated_key}")
+        return phrase_type, image_partial, image_full, (x_offset, y_offset), key_text, key_rect
+
+    # The generator only produces phrases of the expected length inside the F3-E5 range
+    try:
+        phrase_type, image_partial, image_full, score_position, key_text, key_rect = show(prefetcher.get())
+    except ValueError as e:
+        print(f"Error generating phrase: {e}")
+        return finish((True, phrase_type))
     except Exception as e:
         print(f"Error initializing score: {e}")
-        cleanup_files(temp_files)
-        return False, None
+        return finish((False, None))
 
-    toggle_button = pygame.Rect(400, key_y_position + 50, 200, 50)
+    show_partial = True
+    toggle_button = pygame.Rect(400, key_rect.centery + 50, 200, 50)
     toggle_text = "Show Full Phrase"
 
-    running = True
-    while running:
+    return_button = draw_return_arrow(screen)
+
+    def draw(screen):
         screen.fill((255, 255, 255))
         if show_partial:
-            screen.blit(image_partial, (x_offset, y_offset))
+            screen.blit(image_partial, score_position)
         else:
-            screen.blit(image_full, (x_offset, y_offset))
+            screen.blit(image_full, score_position)
         screen.blit(key_text, key_rect)
         draw_footer_text(screen)
         draw_button(screen, toggle_text, toggle_button.x, toggle_button.y, toggle_button.width, toggle_button.height, (200, 200, 200), (0, 0, 0))
-        return_button = draw_return_arrow(screen)
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                cleanup_files(temp_files)
-                return False, None
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE:
-                cleanup_files(temp_files)
-                return True, phrase_type
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if return_button.collidepoint(event.pos):
-                    cleanup_files(temp_files)
-                    return True, phrase_type
-                if toggle_button.collidepoint(event.pos):
-                    if show_partial:
-                        show_partial = False
-                        toggle_text = "Generate Next Phrase"
-                    else:
-                        cleanup_files(temp_files)
-                        # Handle random cycling for 7sus4 phrases
-                        if use_random_cycling and (phrase_type.startswith("7sus4_") or phrase_type.startswith("long_7sus4_")):
-                            # Get next random chord type and update phrase_type
-                            current_chord_type = random_7sus4_cycler.get_next_chord_type()
-                            if phrase_type.startswith("long_7sus4_"):
-                                phrase_type = "long_" + current_chord_type
-                            else:
-                                phrase_type = current_chord_type
-                        
-                        # For chord-specific 7sus4 phrases, find the correct generation key
-                        if selected_key and (phrase_type.startswith("7sus4_") or phrase_type.startswith("long_7sus4_")):
-                            # Extract chord type from phrase type
-                            if phrase_type.startswith("long_7sus4_"):
-                                chord_type = phrase_type.replace("long_7sus4_", "")
-                            else:
-                                chord_type = phrase_type.replace("7sus4_", "")
-                            effective_key = find_7sus4_generation_key(selected_key, chord_type)
-                            key = effective_key
-                        else:
-                            key = key_cycler.next_item()
-                        while True:
-                            # Map new chord-specific phrase types to base types for generation
-                            base_phrase_type = phrase_type
-                            if phrase_type.startswith("7sus4_"):
-                                base_phrase_type = "7sus4"
-                            elif phrase_type.startswith("long_7sus4_"):
-                                base_phrase_type = "long_7sus4"
-                            
-                            transposed_phrase, generated_key, phrase_length = generate_phrase(
-                                left_cycler, 
-                                right_cycler if base_phrase_type not in ["long_25_major", "long_25_minor", "turnaround", "rhythm_changes_56", "ii7_to_v7", "long_major", "long_7sus4"] else resolution_cycler, 
-                                Cycler([key]), 
-                                base_phrase_type
-                            )
-                            if (phrase_length == expected_lengths[phrase_type] and 
-                                is_phrase_in_range(transposed_phrase)):
-                                break
-                            print(f"Generated phrase length {phrase_length} (expected {expected_lengths[phrase_type]}), "
-                                  f"pitch range {'valid' if is_phrase_in_range(transposed_phrase) else 'out of F3-E5 range'}, regenerating with key {key}...")
-                        try:
-                            score_image_partial = generate_partial_score_png(transposed_phrase, phrase_length)
-                            score_image_full = generate_score_png(transposed_phrase)
-                            image_partial = pygame.image.load(score_image_partial)
-                            image_full = pygame.image.load(score_image_full)
-                            orig_width, orig_height = image_full.get_size()
-                            aspect_ratio = orig_width / orig_height
-                            target_width = 1000
-                            target_height = int(target_width / aspect_ratio)
-                            max_height = 560
-                            if target_height > max_height:
-                                target_height = max_height
-                                target_width = int(target_height * aspect_ratio)
-                            image_partial = pygame.transform.scale(image_partial, (target_width, target_height))
-                            image_full = pygame.transform.scale(image_full, (target_width, target_height))
-                            crop_factor = 0.85
-                            crop_height = int(target_height * crop_factor)
-                            image_partial = image_partial.subsurface((0, 0, target_width, crop_height))
-                            image_full = image_full.subsurface((0, 0, target_width, crop_height))
-                            new_height = crop_height
-                            new_width = target_width
-                            y_offset = (600 - new_height - 50) // 2 if (600 - new_height - 50) > 0 else 0
-                            x_offset = (1000 - new_width) // 2
-                            chord_map_key = phrase_type if phrase_type in KEY_CHORD_MAP else "major"
-                            if selected_key:
-                                if phrase_type in ["short_25_major", "long_25_major"]:
-                                    display_text = get_major_25_chord_progression(selected_key)
-                                elif phrase_type in ["short_25_minor", "long_25_minor"]:
-                                    display_text = get_minor_25_chord_progression(selected_key)
-                                elif phrase_type == "turnaround":
-                                    display_text = get_turnaround_chord_progression(selected_key)
-                                elif phrase_type == "rhythm_changes_56":
-                                    display_text = get_rhythm_changes_56_chord_progression(selected_key)
-                                elif phrase_type == "ii7_to_v7":
-                                    display_text = get_ii7_to_v7_chord_progression(selected_key)
-                                elif phrase_type in ["long_major", "major"]:
-                                    display_text = f"in the key of {selected_key}"
-                                elif phrase_type in ["long_7sus4", "7sus4"]:
-                                    display_text = KEY_CHORD_MAP["7sus4"][selected_key]
-                                elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
-                                    display_text = KEY_CHORD_MAP["7sus4_minor"][selected_key]
-                                elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
-                                    display_text = KEY_CHORD_MAP["7sus4_dominant"][selected_key]
-                                elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
-                                    display_text = KEY_CHORD_MAP["7sus4_half_dim"][selected_key]
-                                elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
-                                    display_text = KEY_CHORD_MAP["7sus4_altered"][selected_key]
-                                else:
-                                    display_text = KEY_CHORD_MAP[chord_map_key][selected_key]
-                            else:
-                                # For random mode, use the correct chord progressions with mapping
-                                if phrase_type in ["7sus4", "long_7sus4"]:
-                                    display_text = KEY_CHORD_MAP["7sus4"][generated_key]
-                                elif phrase_type in ["7sus4_minor", "long_7sus4_minor"]:
-                                    target_key = find_7sus4_target_key_for_display(generated_key, "minor")
-                                    display_text = get_7sus4_chord_display(target_key, "minor")
-                                elif phrase_type in ["7sus4_dominant", "long_7sus4_dominant"]:
-                                    target_key = find_7sus4_target_key_for_display(generated_key, "dominant")
-                                    display_text = get_7sus4_chord_display(target_key, "dominant")
-                                elif phrase_type in ["7sus4_half_dim", "long_7sus4_half_dim"]:
-                                    target_key = find_7sus4_target_key_for_display(generated_key, "half_dim")
-                                    display_text = get_7sus4_chord_display(target_key, "half_dim")
-                                elif phrase_type in ["7sus4_altered", "long_7sus4_altered"]:
-                                    target_key = find_7sus4_target_key_for_display(generated_key, "altered")
-                                    display_text = get_7sus4_chord_display(target_key, "altered")
-                                elif phrase_type in ["short_25_major", "long_25_major"]:
-                                    # Map the generated key to the correct display key
-                                    display_key = map_random_key_for_display(phrase_type, generated_key)
-                                    display_text = get_major_25_chord_progression(display_key)
-                                elif phrase_type in ["short_25_minor", "long_25_minor"]:
-                                    # Map the generated key to the correct display key
-                                    display_key = map_random_key_for_display(phrase_type, generated_key)
-                                    display_text = get_minor_25_chord_progression(display_key)
-                                elif phrase_type == "turnaround":
-                                    display_text = get_turnaround_chord_progression(generated_key)
-                                elif phrase_type == "rhythm_changes_56":
-                                    display_text = get_rhythm_changes_56_chord_progression(generated_key)
-                                elif phrase_type == "ii7_to_v7":
-                                    display_text = get_ii7_to_v7_chord_progression(generated_key)
-                                else:
-                                    display_text = KEY_CHORD_MAP[chord_map_key][generated_key]
-                            key_text = font.render(display_text, True, (0, 0, 0))
-                            key_y_position = y_offset + new_height + 30
-                            key_rect = key_text.get_rect(center=(1000 // 2, key_y_position))
-                            print(f"Key text y-position: {key_y_position}")
-                            print(f"Generated phrase: {' '.join(transposed_phrase)}, Display key: {display_text}, Selected key: {selected_key}, Generated key: {generated_key}")
-                            show_partial = True
-                            toggle_text = "Show Full Phrase"
-                        except Exception as e:
-                            print(f"Error generating new score: {e}")
+        draw_return_arrow(screen)
 
-        clock.tick(60)
-    
-    return False, None
\ No newline at end of file
+    page = Page(screen)
+    while True:
+        page.refresh(draw)
+        event = page.wait()
+        if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+            return finish((False, None))
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE:
+            return finish((True, phrase_type))
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            if return_button.collidepoint(event.pos):
+                return finish((True, phrase_type))
+            if toggle_button.collidepoint(event.pos):
+                if show_partial:
+                    show_partial = False
+                    toggle_text = "Generate Next Phrase"
+                    # The reveal images share one layout: only the score and the button change
+                    page.invalidate((score_position, image_full.get_size()), toggle_button)
+                else:
+                    # Logged on the click: the deck may have drawn this phrase well before
+                    session.record("next")
+                    try:
+                        phrase_type, image_partial, image_full, score_position, key_text, key_rect = show(prefetcher.get())
+                        toggle_button.y = key_rect.centery + 50
+                        show_partial = True
+                        toggle_text = "Show Full Phrase"
+                        page.invalidate()
+                    except Exception as e:
+                        print(f"Error generating new score: {e}")
@@ -0,0 +1,57 @@
+# phrase_prefetcher.py
+import queue
+import threading
+
+class PhrasePrefetcher:
+    """Keeps the next few results of produce() ready on a background thread.
+
+    produce is called over and over, one call at a time, and get() hands the
+    results out in the same order, so the sequence is exactly the one calling
+    produce() directly would give. An exception raised by produce is handed
+    out in its place and raised by get(). A prefetcher belongs to one phrase
+    type and key: close it and start a new one when either changes.
+    """
+    def __init__(self, produce, depth=2, on_ready=None):
+        self.produce = produce
+        self.on_ready = on_ready
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                item = (True, self.produce())
+            except Exception as e:
+                item = (False, e)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                except queue.Full:
+                    continue
+                if self.on_ready:
+                    self.on_ready()
+                break
+
+    def ready(self):
+        """True when get() will return without waiting"""
+        return not self._queue.empty()
+
+    def get(self):
+        """The next result, waiting for it if it is not ready yet"""
+        ok, value = self._queue.get()
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        """Stop the background thread and drop everything still queued.
+
+        Waits for a produce() call in progress to finish, so nothing else
+        draws from the same random streams once this returns.
+        """
+        self._stop.set()
+        self._thread.join()
+        while not self._queue.empty():
+            self._queue.get_nowait()
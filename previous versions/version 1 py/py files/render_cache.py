@@ -0,0 +1,114 @@
+# render_cache.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+def content_key(source, **options):
+    """Cache key for a LilyPond source rendered with the given options"""
+    payload = source + "\0" + json.dumps(options, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class DiskCache:
+    """Rendered files (PNG, SVG...) named by content key, kept under max_bytes.
+
+    The least recently used files are deleted first when a new file pushes
+    the total over the limit. Files left from earlier runs are picked up, in
+    order of their modification time.
+    """
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # File name -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+        self.total_bytes = sum(self._entries.values())
+
+    def get(self, key, ext=".png"):
+        """Path of the cached file, or None"""
+        name = key + ext
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            # Keeps the LRU order across runs
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(name, 0)
+            return None
+        return path
+
+    def get_bytes(self, key, ext=".png"):
+        """Contents of the cached file, or None"""
+        path = self.get(key, ext)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            return None
+
+    def put_bytes(self, key, data, ext=".png"):
+        """Store rendered bytes in the cache and return the file's path"""
+        temp_path = os.path.join(self.directory, f"{key}{ext}.{os.getpid()}.{threading.get_ident()}.part.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        return self.put(key, temp_path, ext)
+
+    def put(self, key, source_path, ext=".png"):
+        """Move a freshly rendered file into the cache and return its new path"""
+        name = key + ext
+        path = os.path.join(self.directory, name)
+        size = os.path.getsize(source_path)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.move(source_path, temp_path)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                try:
+                    os.remove(os.path.join(self.directory, old_name))
+                except FileNotFoundError:
+                    pass
+        return path
+
+class MemoryCache:
+    """Least recently used cache of decoded objects, e.g. scaled pygame surfaces"""
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
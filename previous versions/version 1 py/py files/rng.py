@@ -0,0 +1,35 @@
+# rng.py
+import hashlib
+import os
+import random
+
+def derive_seed(*parts):
+    """64-bit seed derived from any mix of seeds, names and numbers"""
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def new_seed():
+    """Fresh 64-bit seed from the operating system"""
+    return int.from_bytes(os.urandom(8), "big")
+
+class RandomStream(random.Random):
+    """A seeded random.Random that can be split into independent substreams.
+
+    A substream's seed depends only on its parent's seed and its name, never
+    on how many numbers the parent has drawn, so spawn("keys") gives the same
+    stream however the rest of the program used the parent.
+    """
+    def __init__(self, seed=None):
+        self.seed_value = new_seed() if seed is None else seed
+        super().__init__(self.seed_value)
+
+    def spawn(self, name):
+        """Independent substream identified by name"""
+        return RandomStream(derive_seed(self.seed_value, name))
+
+    def split(self, n):
+        """n independent substreams, e.g. one per worker"""
+        return [self.spawn(i) for i in range(n)]
+
+    def __reduce__(self):
+        return self.__class__, (self.seed_value,), self.getstate()
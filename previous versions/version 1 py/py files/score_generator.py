@@ -1,52 +1,78 @@
 # score_generator.py
 import subprocess
 import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from spelling import NOTE_TOKENS
+from render_cache import DiskCache, content_key
+
+LILYPOND_VERSION = '\\version "2.24.0"'
+
+# Scores are engraved on a 200mm line and shown SCORE_WIDTH pixels wide
+LINE_WIDTH_MM = 200
+SCORE_WIDTH = 1000
+
+# Rendered scores by content hash, shared by every run of the app
+SCORE_CACHE_DIR = os.environ.get("SCORE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "score_cache"))
+SCORE_CACHE = DiskCache(SCORE_CACHE_DIR)
+
+# LilyPond's private output directories go to RAM where the system has one
+RENDER_TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
 
 def convert_to_lilypond_note(note):
-    note_name = note[:-1]
-    octave = int(note[-1])
-    
-    if len(note_name) == 1:
-        lilypond_note = note_name.lower()
-    else:
-        base_note = note_name[0].lower()
-        accidental = note_name[1]
-        if accidental == "#":
-            lilypond_note = base_note + "is"
-        else:
-            lilypond_note = base_note + "es"
-    
-    octave_diff = octave - 3
-    if octave_diff >= 0:
-        octave_mark = "'" * octave_diff
-    else:
-        octave_mark = "," * abs(octave_diff)
-    
-    return f"{lilypond_note}{octave_mark}8"
-
-def generate_score_ly(phrase, partial=False, phrase_length=9):
-    if partial:
-        if phrase_length < 5:
-            raise ValueError("Phrase must have at least 5 notes for partial display")
-        if phrase_length == 9:
-            notes = [phrase[0], phrase[4], phrase[8]]
-            lilypond_notes_list = [convert_to_lilypond_note(note) for note in notes]
-            lilypond_notes = f"{lilypond_notes_list[0]} r8 r8 r8 {lilypond_notes_list[1]} r8 r8 r8 {lilypond_notes_list[2]}"
-        elif phrase_length == 17:
-            notes = [phrase[0], phrase[4], phrase[8], phrase[12], phrase[16]]
-            lilypond_notes_list = [convert_to_lilypond_note(note) for note in notes]
-            lilypond_notes = f"{lilypond_notes_list[0]} r8 r8 r8 {lilypond_notes_list[1]} r8 r8 r8 {lilypond_notes_list[2]} r8 r8 r8 {lilypond_notes_list[3]} r8 r8 r8 {lilypond_notes_list[4]}"
-        else:
-            notes = [phrase[0], phrase[4], phrase[-1]]
-            lilypond_notes_list = [convert_to_lilypond_note(note) for note in notes]
-            lilypond_notes = f"{lilypond_notes_list[0]} r8 r8 r8 {lilypond_notes_list[1]} r8 r8 r8 {lilypond_notes_list[2]}"
+    return f"{NOTE_TOKENS[note]}8"
+
+# Every REVEAL_EVERY-th note (and the last one) stays visible in the partial score
+REVEAL_EVERY = 4
+
+# Grobs of hidden notes are tagged with this class in SVG output
+HIDDEN_CLASS = "hidden"
+
+def revealed_notes(phrase_length, reveal=REVEAL_EVERY):
+    """Indices of the notes shown in the partial score.
+
+    reveal is either a step (every reveal-th note from the first, plus the
+    last one) or an explicit collection of note indices.
+    """
+    if phrase_length < 5:
+        raise ValueError("Phrase must have at least 5 notes for partial display")
+    if isinstance(reveal, int):
+        shown = set(range(0, phrase_length, reveal)) | {phrase_length - 1}
     else:
-        notes = phrase
-        lilypond_notes = " ".join(convert_to_lilypond_note(note) for note in notes)
-    
-    print(f"Generating score {'partial' if partial else 'full'}: phrase={phrase}, notes={notes}, lilypond_notes={lilypond_notes}")
-    content = f"""
-\\version "2.24.0"
+        shown = {i % phrase_length for i in reveal}
+    return sorted(shown)
+
+def shown_accidentals(phrase, shown, bar_length=8):
+    """Indices of shown notes that need an accidental in the partial score.
+
+    That is every shown note whose alteration differs from the one the
+    earlier shown notes of its bar left on its step and octave (none in C
+    major). Hidden notes do not count: the reader of the partial score never
+    saw them, so a hidden F#4 does not make a later shown F#4 sharp.
+    phrase holds note names, or None for rests.
+    """
+    needed = set()
+    alterations = {}
+    for i, note in enumerate(phrase):
+        if i % bar_length == 0:
+            alterations = {}
+        if note is None or i not in shown:
+            continue
+        step, alteration, octave = note[0], note[1:-1], note[-1]
+        if alterations.get((step, octave), "") != alteration:
+            needed.add(i)
+            alterations[(step, octave)] = alteration
+    return needed
+
+def partial_events(phrase, phrase_length, reveal=REVEAL_EVERY):
+    """The notes of the partial score, with None for every note replaced by a rest"""
+    shown = set(revealed_notes(phrase_length, reveal))
+    return [note if i in shown else None for i, note in enumerate(phrase[:phrase_length])]
+
+def _score_source(lilypond_notes):
+    return f"""
+{LILYPOND_VERSION}
 \\paper {{
   #(set-paper-size '(cons (* 8 in) (* 2.5 in)))
   indent = 0\\mm
@@ -54,7 +80,7 @@ def generate_score_ly(phrase, partial=False, phrase_length=9):
   right-margin = 0\\mm
   top-margin = 0\\mm
   bottom-margin = 0\\mm
-  line-width = 200\\mm
+  line-width = {LINE_WIDTH_MM}\\mm
   ragged-right = ##f
   system-count = 1
 }}
@@ -63,6 +89,9 @@ def generate_score_ly(phrase, partial=False, phrase_length=9):
     \\override Staff.StaffSymbol.thickness = #0.5
     \\set Staff.fontSize = #2
     \\override Staff.StaffSymbol.staff-space = #1.0
+    % Same height for every phrase (F3 to E6 with stems), so cropped partial
+    % and full images line up
+    \\override Staff.StaffSymbol.Y-extent = #'(-7.5 . 7.5)
     \\clef treble
     \\key c \\major
     {lilypond_notes}
@@ -75,37 +104,193 @@ def generate_score_ly(phrase, partial=False, phrase_length=9):
   }}
 }}
 """
-    filename = "score.ly" if not partial else "score_partial.ly"
-    with open(filename, "w") as f:
-        f.write(content)
-    print(f"Generated {filename} content:\n{content}")
-    return filename
-
-def generate_score_png(phrase):
-    filename = generate_score_ly(phrase)
-    try:
-        result = subprocess.run(["lilypond", "--png", "-o", "score", filename], check=True, capture_output=True, text=True)
-        print(f"LilyPond output for score: stdout={result.stdout}, stderr={result.stderr}")
-    except subprocess.CalledProcessError as e:
-        print(f"LilyPond error for score: stdout={e.stdout}, stderr={e.stderr}")
-        raise
-    if not os.path.exists("score.png"):
-        raise FileNotFoundError("score.png was not generated")
-    return "score.png"
 
-def generate_partial_score_png(phrase, phrase_length):
-    filename = generate_score_ly(phrase, partial=True, phrase_length=phrase_length)
+def build_score_source(phrase, partial=False, phrase_length=9, reveal=REVEAL_EVERY):
+    """LilyPond source for the full phrase, or for the partial one with the hidden notes replaced by rests"""
+    events = partial_events(phrase, phrase_length, reveal) if partial else phrase
+    return _score_source(" ".join("r8" if note is None else convert_to_lilypond_note(note) for note in events))
+
+# Tags everything drawn for the next note with HIDDEN_CLASS. Written out in
+# full before every hidden note, since a source may become one \\book of a
+# batch, where it cannot define variables.
+HIDE_NEXT_NOTE = " ".join(
+    f"\\once \\override {grob}.output-attributes = #'((class . \"{HIDDEN_CLASS}\"))"
+    for grob in ("NoteHead", "Stem", "Flag", "Accidental", "Beam"))
+
+# Ledger lines of all notes are one staff-wide LedgerLineSpanner, which
+# cannot be tagged per note: a hidden note draws its own as part of its
+# NoteHead instead, keeping the extents of the bare note head so the
+# layout does not change.
+HIDE_NEXT_NOTE += """
+    \\once \\override NoteHead.no-ledgers = ##t
+    \\once \\override NoteHead.stencil = #(lambda (grob)
+      (let* ((head (ly:note-head::print grob))
+             (x (ly:stencil-extent head X))
+             (pos (ly:grob-staff-position grob))
+             (thickness (+ (ly:staff-symbol-line-thickness grob) 0.1))
+             (ledgers (cond ((< pos -5) (iota (quotient (- -4 pos) 2) -6 -2))
+                            ((> pos 5) (iota (quotient (- pos 4) 2) 6 2))
+                            (else '()))))
+        (ly:make-stencil
+          (ly:stencil-expr
+            (fold (lambda (ledger stencil)
+                    (ly:stencil-add stencil
+                      (make-line-stencil thickness (- (car x) 0.3) (/ (- ledger pos) 2)
+                                         (+ (cdr x) 0.3) (/ (- ledger pos) 2))))
+                  head ledgers))
+          x (ly:stencil-extent head Y))))"""
+
+def build_reveal_source(phrase, reveal=REVEAL_EVERY):
+    """LilyPond source for both the full and the partial score of a phrase.
+
+    Engraved once with the SVG backend: the hidden notes are laid out like
+    any other but tagged with HIDDEN_CLASS, and hide_hidden_notes() turns
+    the full score into the partial one. Beams never join a shown note to
+    a hidden one, so eighths are beamed by runs of hidden notes within each
+    group of four and shown notes carry flags. Shown notes whose accidental
+    LilyPond would leave out because of a hidden note get a forced one (!).
+    """
+    shown = set(revealed_notes(len(phrase), reveal))
+    forced = shown_accidentals(phrase, shown)
+    tokens = []
+    for start in range(0, len(phrase), 4):
+        group = range(start, min(start + 4, len(phrase)))
+        runs = []
+        for i in group:
+            if runs and (i in shown) == (runs[-1][-1] in shown):
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+        for run in runs:
+            for i in run:
+                token = convert_to_lilypond_note(phrase[i])
+                if i in forced:
+                    token = token[:-1] + "!" + token[-1:]
+                if len(run) > 1 and i == run[0]:
+                    token += "["
+                elif len(run) > 1 and i == run[-1]:
+                    token += "]"
+                tokens.append(token if i in shown else f"{HIDE_NEXT_NOTE}\n    {token}")
+    return _score_source("\\autoBeamOff\n    " + "\n    ".join(tokens))
+
+def hide_hidden_notes(svg):
+    """The partial score from the SVG of a reveal source: hidden notes keep their place but are not drawn"""
+    return svg.replace(f'class="{HIDDEN_CLASS}"', f'class="{HIDDEN_CLASS}" display="none"')
+
+def svg_for_width(svg, width_px=SCORE_WIDTH):
+    """SVG whose root size is width_px pixels wide, keeping its aspect ratio, so it rasterizes at that width"""
+    root_end = svg.index(">", svg.index("<svg"))
+    root = svg[:root_end]
+    _, _, view_width, view_height = (float(v) for v in re.search(r'viewBox="([^"]+)"', root).group(1).replace(",", " ").split())
+    height_px = round(width_px * view_height / view_width)
+    root = re.sub(r'\swidth="[^"]*"', "", root)
+    root = re.sub(r'\sheight="[^"]*"', "", root)
+    return f'{root} width="{width_px}" height="{height_px}"' + svg[root_end:]
+
+def resolution_for_width(width_px):
+    """DPI at which the score's line is width_px pixels wide"""
+    return round(width_px * 25.4 / LINE_WIDTH_MM)
+
+def render_options(width_px=SCORE_WIDTH, output_format="png"):
+    """Options of a screen render: cropped to the music, PNGs at the DPI that fits width_px.
+
+    SVGs do not depend on the width: svg_for_width() sizes them when they are rasterized.
+    """
+    if output_format == "svg":
+        return {"format": "svg", "crop": True}
+    return {"format": "png", "crop": True, "resolution": resolution_for_width(width_px)}
+
+def score_key(source, width_px=SCORE_WIDTH, output_format="png"):
+    """Render cache key of a source rendered for the screen"""
+    return content_key(source, **render_options(width_px, output_format))
+
+def engrave(source, work_dir, name=None, options=None):
+    """Run LilyPond on a source fed through stdin, inside work_dir, where every file it writes stays.
+
+    LilyPond cannot write PNG to stdout, so the images still land in work_dir,
+    named name.png (or by each \\book's \\bookOutputName when name is None).
+    options from render_options() pick PNG or SVG output, crop the images to
+    the music and set the DPI.
+    """
+    output_format = options["format"] if options else "png"
+    command = ["lilypond", f"--{output_format}"]
+    if options:
+        if "resolution" in options:
+            command.append(f"-dresolution={options['resolution']}")
+        if options["crop"]:
+            command.append("-dcrop")
+    command += (["-o", name] if name else []) + ["-"]
     try:
-        result = subprocess.run(["lilypond", "--png", "-o", "score_partial", filename], check=True, capture_output=True, text=True)
-        print(f"LilyPond output for score_partial: stdout={result.stdout}, stderr={result.stderr}")
+        result = subprocess.run(command, input=source, cwd=work_dir, check=True, capture_output=True, text=True)
+        print(f"LilyPond output for {name or 'batch'}: stdout={result.stdout}, stderr={result.stderr}")
     except subprocess.CalledProcessError as e:
-        print(f"LilyPond error for score_partial: stdout={e.stdout}, stderr={e.stderr}")
+        print(f"LilyPond error for {name or 'batch'}: stdout={e.stdout}, stderr={e.stderr}")
         raise
-    if not os.path.exists("score_partial.png"):
-        raise FileNotFoundError("score_partial.png was not generated")
-    return "score_partial.png"
-
-def cleanup_files(files):
-    for file in files:
-        if os.path.exists(file):
-            os.remove(file)
\ No newline at end of file
+
+def output_png(work_dir, name, ext=".png"):
+    """The image LilyPond wrote for name: versions before 2.24 keep the cropped one in name.cropped.png"""
+    for filename in (f"{name}.cropped{ext}", f"{name}{ext}"):
+        path = os.path.join(work_dir, filename)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"{name}{ext} was not generated")
+
+def render_sources(sources, cache=None, width_px=SCORE_WIDTH):
+    """PNG files for several LilyPond sources, in order, from the render cache"""
+    cache = SCORE_CACHE if cache is None else cache
+    render_sources_data(sources, cache, width_px)
+    return [cache.get(score_key(source, width_px), ".png") for source in sources]
+
+def render_sources_data(sources, cache=None, width_px=SCORE_WIDTH, output_format="png"):
+    """PNG (or SVG) bytes for several LilyPond sources, in order, each cropped
+    to the music and, for PNGs, exactly width_px wide.
+
+    Sources missing from the render cache are engraved together by a single
+    LilyPond process: each becomes one \\book of a combined source, named by
+    its content key through \\bookOutputName. The images are read back from
+    a private directory (in memory where /dev/shm exists) and stored in the
+    cache.
+    """
+    cache = SCORE_CACHE if cache is None else cache
+    ext = "." + output_format
+    keys = [score_key(source, width_px, output_format) for source in sources]
+    data = {key: cache.get_bytes(key, ext) for key in keys}
+    missing = {key: source for key, source in zip(keys, sources) if data[key] is None}
+    if missing:
+        with tempfile.TemporaryDirectory(prefix="score_render_", dir=RENDER_TEMP_DIR) as work_dir:
+            books = []
+            for key, source in missing.items():
+                body = source.replace(LILYPOND_VERSION, "", 1)
+                books.append(f"\\book {{\n  \\bookOutputName \"{key}\"\n{body}}}\n")
+            engrave(LILYPOND_VERSION + "\n" + "".join(books), work_dir, options=render_options(width_px, output_format))
+            for key in missing:
+                with open(output_png(work_dir, key, ext), "rb") as f:
+                    data[key] = f.read()
+                cache.put_bytes(key, data[key], ext)
+    return [data[key] for key in keys]
+
+def render_reveal(phrase, reveal=REVEAL_EVERY, cache=None, width_px=SCORE_WIDTH):
+    """(partial, full) SVGs of a phrase, width_px wide, from a single engraving.
+
+    Both come from the same layout, so they line up pixel for pixel.
+    """
+    svg = render_sources_data([build_reveal_source(phrase, reveal)], cache, width_px, "svg")[0].decode()
+    full = svg_for_width(svg, width_px)
+    return hide_hidden_notes(full), full
+
+def render_scores(requests, batch_size=32, max_processes=None, cache=None, width_px=SCORE_WIDTH):
+    """PNGs for many (phrase, partial, phrase_length) requests, in order.
+
+    The requests are engraved in batches of batch_size scores per LilyPond
+    process, with at most max_processes (the CPU count by default) running
+    at once. Use it to warm the render cache or to export a whole corpus.
+    """
+    sources = [build_score_source(phrase, partial, phrase_length) for phrase, partial, phrase_length in requests]
+    # Each distinct source is engraved once, however often it is requested
+    unique_sources = list(dict.fromkeys(sources))
+    batches = [unique_sources[i:i + batch_size] for i in range(0, len(unique_sources), batch_size)]
+    paths = {}
+    with ThreadPoolExecutor(max_workers=max_processes or os.cpu_count()) as pool:
+        for batch, batch_paths in zip(batches, pool.map(lambda batch: render_sources(batch, cache, width_px), batches)):
+            paths.update(zip(batch, batch_paths))
+    return [paths[source] for source in sources]
@@ -0,0 +1,151 @@
+# session.py
+"""Record a practice session (seed plus user actions) and replay it headlessly.
+
+Every random choice the app makes comes from a named substream of the
+session seed, so replaying the recorded actions against the same seed
+reproduces exactly the same chord types, keys and phrases:
+
+    python main.py --seed 1234 --record session.json
+    python session.py session.json
+
+Nothing here imports pygame.
+"""
+import json
+import sys
+import time
+
+from constants import KEYS
+from data import find_7sus4_generation_key, get_dominant_or_relative_major_key
+from music_utils import Cycler
+from phrase_generator import generate_phrase
+from random_cycler import Random7sus4Cycler
+from rng import RandomStream
+
+class Session:
+    """Seed, random streams and action log of one practice session"""
+    def __init__(self, seed=None, actions=None):
+        self.rng = RandomStream(seed)
+        self.seed = self.rng.seed_value
+        self.actions = [] if actions is None else list(actions)
+        self._streams = {}
+        self.chord_type_cycler = Random7sus4Cycler(self.stream("7sus4"))
+
+    def stream(self, name):
+        """The session's substream for one kind of choice, e.g. "keys" or "phrases" """
+        if name not in self._streams:
+            self._streams[name] = self.rng.spawn(name)
+        return self._streams[name]
+
+    def record(self, action, **details):
+        self.actions.append(dict(details, action=action))
+
+    def next_chord_type(self):
+        """Next 7sus4 chord type from the session's shuffled rounds"""
+        self.record("chord_type")
+        return self.chord_type_cycler.get_next_chord_type()
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"seed": self.seed, "actions": self.actions}, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        """Recorded session, with an empty action log ready to be replayed"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["seed"]), data["actions"]
+
+def base_phrase_type(phrase_type):
+    """Map chord-specific 7sus4 phrase types to the type the generator knows"""
+    if phrase_type.startswith("7sus4_"):
+        return "7sus4"
+    if phrase_type.startswith("long_7sus4_"):
+        return "long_7sus4"
+    return phrase_type
+
+def chord_type_of(phrase_type):
+    return phrase_type.replace("long_7sus4_", "").replace("7sus4_", "")
+
+def is_chord_specific_7sus4(phrase_type):
+    return phrase_type.startswith("7sus4_") or phrase_type.startswith("long_7sus4_")
+
+class PhraseDeck:
+    """Chooses the chord type, key and phrase for every step of one phrase
+    generator run, drawing from the session's streams.
+
+    Phrases may be generated ahead of time (see PhrasePrefetcher): the caller
+    records "next" when the user actually asks for the next phrase, and the
+    draws come out the same whenever they are made, since every kind of
+    choice has its own stream.
+    """
+    def __init__(self, session, phrase_type, selected_key=None, use_random_cycling=False):
+        self.session = session
+        self.phrase_type = phrase_type
+        self.selected_key = selected_key
+        self.use_random_cycling = use_random_cycling
+        session.record("start", phrase_type=phrase_type, key=selected_key, use_random_cycling=use_random_cycling)
+
+        self.key_cycler = Cycler(list(KEYS.keys()), session.stream("keys"))
+        if selected_key:
+            # For chord-specific 7sus4 phrases, find the correct generation key
+            if is_chord_specific_7sus4(phrase_type):
+                effective_key = find_7sus4_generation_key(selected_key, chord_type_of(phrase_type))
+            else:
+                effective_key = get_dominant_or_relative_major_key(phrase_type, selected_key)
+            self.key_cycler = Cycler([effective_key], session.stream("keys"))
+        # Shuffled rounds of the chain sampler, per base phrase type, so a cell
+        # is not heard again before the others that fit have come up
+        self.rounds = {}
+        self.started = False
+
+    def next_phrase(self):
+        """Generate the next phrase: returns (phrase_type, note names, generated key, length)"""
+        # generate_phrase draws the key, skipping keys the phrase type cannot fit in
+        key_cycler = self.key_cycler
+        if not self.started:
+            self.started = True
+        else:
+            if self.use_random_cycling and is_chord_specific_7sus4(self.phrase_type):
+                current_chord_type = self.session.chord_type_cycler.get_next_chord_type()
+                if self.phrase_type.startswith("long_7sus4_"):
+                    self.phrase_type = "long_" + current_chord_type
+                else:
+                    self.phrase_type = current_chord_type
+            if self.selected_key and is_chord_specific_7sus4(self.phrase_type):
+                key_cycler = Cycler([find_7sus4_generation_key(self.selected_key, chord_type_of(self.phrase_type))])
+        # The left and right cell cyclers are not used by the chain sampler
+        phrase_type = base_phrase_type(self.phrase_type)
+        transposed_phrase, generated_key, phrase_length = generate_phrase(
+            None, None, key_cycler, phrase_type, self.session.stream("phrases"), self.rounds.setdefault(phrase_type, {}))
+        return self.phrase_type, transposed_phrase, generated_key, phrase_length
+
+def replay(path):
+    """Replay a recorded session without a display, returning every generated
+    phrase as (phrase_type, note names, generated key, seconds taken)"""
+    session, actions = Session.load(path)
+    results = []
+    deck = None
+    for action in actions:
+        start = time.perf_counter()
+        if action["action"] == "chord_type":
+            session.next_chord_type()
+            continue
+        if action["action"] == "start":
+            deck = PhraseDeck(session, action["phrase_type"], action["key"], action["use_random_cycling"])
+        elif action["action"] != "next" or deck is None:
+            continue
+        try:
+            phrase_type, transposed_phrase, generated_key, _ = deck.next_phrase()
+        except ValueError as e:
+            print(f"Error generating phrase: {e}")
+            continue
+        results.append((phrase_type, transposed_phrase, generated_key, time.perf_counter() - start))
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python session.py SESSION_JSON")
+        sys.exit(1)
+    results = replay(sys.argv[1])
+    total = sum(seconds for *_, seconds in results)
+    print(f"Replayed {len(results)} phrases in {total * 1000:.1f} ms")
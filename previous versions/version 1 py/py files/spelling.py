@@ -0,0 +1,41 @@
+# spelling.py
+from constants import PITCH_CLASSES_SHARP, PITCH_CLASSES_FLAT, FLAT_KEYS
+
+# Spelling contexts: sharp keys and flat keys
+SHARP = 0
+FLAT = 1
+
+def spelling_context(key):
+    return FLAT if key in FLAT_KEYS else SHARP
+
+def _lilypond_token(pitch_name, octave):
+    """LilyPond pitch for a note name without duration, e.g. ("Bb", 4) -> "bes'" """
+    if len(pitch_name) == 1:
+        lilypond_note = pitch_name.lower()
+    else:
+        lilypond_note = pitch_name[0].lower() + ("is" if pitch_name[1] == "#" else "es")
+    octave_diff = octave - 3
+    octave_mark = "'" * octave_diff if octave_diff >= 0 else "," * -octave_diff
+    return lilypond_note + octave_mark
+
+# SPELLINGS[context][midi] -> (note name, LilyPond pitch) for every MIDI number.
+# A MIDI number is pitch_class + (octave + 1) * 12, so this is the dense
+# (pitch class, octave, context) table flattened into one list per context.
+SPELLINGS = []
+for pitch_classes in (PITCH_CLASSES_SHARP, PITCH_CLASSES_FLAT):
+    row = []
+    for midi in range(128):
+        pitch_name, octave = pitch_classes[midi % 12], midi // 12 - 1
+        row.append((f"{pitch_name}{octave}", _lilypond_token(pitch_name, octave)))
+    SPELLINGS.append(row)
+
+# Note name -> LilyPond pitch for both spellings of every note
+NOTE_TOKENS = {name: token for row in SPELLINGS for name, token in row}
+
+def spell(midi, key="C"):
+    """Note name for a MIDI number in the given key"""
+    return SPELLINGS[spelling_context(key)][midi][0]
+
+def spell_lilypond(midi, key="C"):
+    """LilyPond pitch for a MIDI number in the given key"""
+    return SPELLINGS[spelling_context(key)][midi][1]
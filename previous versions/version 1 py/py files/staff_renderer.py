@@ -0,0 +1,286 @@
+# staff_renderer.py
+"""Native treble-staff renderer for the practice loop.
+
+Draws a phrase of eighth notes and eighth rests (C major, 4/4, beamed in
+groups of four) without LilyPond: layout_staff works out every staff line,
+notehead, stem, beam, flag, ledger line and accidental in staff spaces, and
+the result is drawn either onto a pygame Surface, from glyphs rasterized once
+per size, or as SVG. The layout and SVG output are headless; pygame is only
+imported when drawing surfaces. LilyPond (score_generator) stays the backend
+for high-quality export.
+"""
+import math
+
+from score_generator import REVEAL_EVERY, revealed_notes, shown_accidentals
+
+LETTERS = "CDEFGAB"
+ACCIDENTALS = {"": 0, "#": 1, "b": -1}
+
+# Glyphs in staff spaces around their anchor point (y grows downwards): a
+# list of ("fill", points) polygons and ("stroke", points, width) polylines
+def _ellipse(rx, ry, angle=0.0, cx=0.0, cy=0.0, steps=24):
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    points = []
+    for i in range(steps):
+        t = 2 * math.pi * i / steps
+        x, y = rx * math.cos(t), ry * math.sin(t)
+        points.append((cx + x * cos_a - y * sin_a, cy + x * sin_a + y * cos_a))
+    return points
+
+GLYPHS = {
+    "notehead": [("fill", _ellipse(0.66, 0.44, -0.35))],
+    "sharp": [
+        ("stroke", [(-0.22, -1.2), (-0.22, 1.4)], 0.1),
+        ("stroke", [(0.22, -1.4), (0.22, 1.2)], 0.1),
+        ("stroke", [(-0.5, -0.25), (0.5, -0.55)], 0.28),
+        ("stroke", [(-0.5, 0.55), (0.5, 0.25)], 0.28),
+    ],
+    "flat": [
+        ("stroke", [(-0.3, -1.8), (-0.3, 0.5)], 0.12),
+        ("stroke", [(-0.3, 0.5), (0.2, 0.05), (0.35, -0.3), (0.15, -0.45), (-0.3, -0.15)], 0.16),
+    ],
+    "natural": [
+        ("stroke", [(-0.25, -1.4), (-0.25, 0.6)], 0.1),
+        ("stroke", [(0.25, -0.6), (0.25, 1.4)], 0.1),
+        ("stroke", [(-0.25, -0.3), (0.25, -0.5)], 0.26),
+        ("stroke", [(-0.25, 0.5), (0.25, 0.3)], 0.26),
+    ],
+    "rest": [
+        ("fill", _ellipse(0.2, 0.2, cx=-0.25, cy=-0.55)),
+        ("stroke", [(-0.35, -0.45), (-0.05, -0.3), (0.35, -0.6), (-0.15, 1.0)], 0.13),
+    ],
+    "flag_up": [("stroke", [(0.0, 0.0), (0.15, 0.6), (0.75, 1.3), (0.85, 2.0), (0.6, 2.6)], 0.2)],
+    "flag_down": [("stroke", [(0.0, 0.0), (0.15, -0.6), (0.75, -1.3), (0.85, -2.0), (0.6, -2.6)], 0.2)],
+    # Anchored on the G line
+    "clef": [
+        ("stroke", [(-0.35, 2.6), (-0.05, 2.95), (0.35, 2.75), (0.4, 2.2), (0.1, -1.5), (0.0, -3.2),
+                    (0.3, -4.3), (0.7, -3.6), (0.45, -2.6), (-0.6, -1.4), (-1.0, -0.3), (-0.8, 0.7),
+                    (0.0, 1.1), (0.8, 0.7), (0.9, -0.1), (0.45, -0.6), (-0.2, -0.4), (-0.3, 0.2), (0.1, 0.4)], 0.22),
+        ("fill", _ellipse(0.28, 0.28, cx=-0.45, cy=2.45)),
+    ],
+}
+
+STAFF_LINE = 0.1
+STEM = 0.12
+BEAM = 0.5
+STEM_LENGTH = 3.5
+TOP_MARGIN = 4.5
+BAR_SPACE = 1.2
+HEIGHT = 16.0
+NOTES_START = 5.0
+
+def parse_note(name):
+    """("C#5") -> (letter index, alteration, octave)"""
+    return LETTERS.index(name[0]), ACCIDENTALS[name[1:-1]], int(name[-1])
+
+def staff_position(letter, octave):
+    """Half staff spaces above the bottom line (E4)"""
+    return octave * 7 + letter - (4 * 7 + 2)
+
+def staff_y(position):
+    return TOP_MARGIN + (8 - position) / 2
+
+def layout_staff(events, width, hidden=()):
+    """Everything to draw for a bar of eighth notes, in staff spaces.
+
+    events holds note names, or None for an eighth rest. Returns two lists
+    of ("line", x1, y1, x2, y2, thickness), ("beam", x1, y1, x2, y2) and
+    ("glyph", name, x, y) items on a width x HEIGHT canvas: the items of
+    the staff and its shown notes, and those of the notes whose indices are
+    in hidden. Hidden notes are laid out like the others, so drawing both
+    lists gives the full score and drawing the first the partial one. A
+    shown note gets an accidental wherever either score needs one.
+    """
+    items = []
+    hidden_items = []
+    for line in range(5):
+        y = TOP_MARGIN + line
+        items.append(("line", 0.0, y, width, y, STAFF_LINE))
+    items.append(("glyph", "clef", 1.8, staff_y(2)))
+
+    bars = (len(events) - 1) // 8
+    step = (width - NOTES_START - 1.0 - bars * BAR_SPACE) / max(len(events), 1)
+    notes = []
+    alterations = {}
+    # Accidentals the partial score needs although the full one would not
+    forced = shown_accidentals(events, set(range(len(events))) - set(hidden))
+    for i, name in enumerate(events):
+        note_items = hidden_items if i in hidden else items
+        x = NOTES_START + step * (i + 0.5) + BAR_SPACE * (i // 8)
+        if i and i % 8 == 0:
+            # Bar line at every full 4/4 measure; accidentals last one measure
+            bar_x = x - step / 2 - BAR_SPACE + 0.3
+            items.append(("line", bar_x, TOP_MARGIN, bar_x, TOP_MARGIN + 4, STEM))
+            alterations = {}
+        if name is None:
+            note_items.append(("glyph", "rest", x, staff_y(4)))
+            notes.append(None)
+            continue
+        letter, alteration, octave = parse_note(name)
+        position = staff_position(letter, octave)
+        y = staff_y(position)
+        if alterations.get((letter, octave), 0) != alteration or i in forced:
+            accidental = {1: "sharp", -1: "flat", 0: "natural"}[alteration]
+            note_items.append(("glyph", accidental, x - 1.5, y))
+            alterations[(letter, octave)] = alteration
+        for ledger in list(range(-2, position - 1, -2)) + list(range(10, position + 1, 2)):
+            note_items.append(("line", x - 1.0, staff_y(ledger), x + 1.0, staff_y(ledger), STAFF_LINE * 1.5))
+        note_items.append(("glyph", "notehead", x, y))
+        notes.append((x, y, position))
+
+    # Eighths are beamed in groups of four, split where notes go from shown
+    # to hidden; a lone note gets a flag
+    runs = []
+    for start in range(0, len(notes), 4):
+        for i in range(start, min(start + 4, len(notes))):
+            if notes[i] is None:
+                continue
+            if runs and runs[-1][0] == start and (i in hidden) == (runs[-1][1] in hidden):
+                runs[-1][2].append(notes[i])
+            else:
+                runs.append((start, i, [notes[i]]))
+    for _, first, group in runs:
+        run_items = hidden_items if first in hidden else items
+        up = sum(position for _, _, position in group) / len(group) < 4
+        direction = -1 if up else 1
+        stem_x = [x + 0.6 if up else x - 0.6 for x, _, _ in group]
+        if len(group) == 1:
+            x, y, _ = group[0]
+            end_y = y + direction * STEM_LENGTH
+            run_items.append(("line", stem_x[0], y, stem_x[0], end_y, STEM))
+            run_items.append(("glyph", "flag_up" if up else "flag_down", stem_x[0], end_y))
+            continue
+        first_y, last_y = group[0][1], group[-1][1]
+        slope = max(-0.25, min(0.25, (last_y - first_y) / (stem_x[-1] - stem_x[0])))
+        # Place the beam so the shortest stem is still STEM_LENGTH long
+        along_beam = [y - slope * (sx - stem_x[0]) for sx, (_, y, _) in zip(stem_x, group)]
+        beam_y0 = min(along_beam) - STEM_LENGTH if up else max(along_beam) + STEM_LENGTH
+        for sx, (_, y, _) in zip(stem_x, group):
+            run_items.append(("line", sx, y, sx, beam_y0 + slope * (sx - stem_x[0]), STEM))
+        run_items.append(("beam", stem_x[0], beam_y0, stem_x[-1], beam_y0 + slope * (stem_x[-1] - stem_x[0])))
+    return items, hidden_items
+
+def score_layouts(phrase, width, reveal=REVEAL_EVERY):
+    """Layout of a phrase split into the items of the partial score and those
+    of the notes it hides, which together make the full score"""
+    shown = set(revealed_notes(len(phrase), reveal))
+    return layout_staff(phrase, width, set(range(len(phrase))) - shown)
+
+# SVG output
+
+def _svg_points(points, x, y, scale):
+    return " ".join(f"{(x + px) * scale:.2f},{(y + py) * scale:.2f}" for px, py in points)
+
+def layout_to_svg(items, width, staff_space=16, hidden_items=()):
+    """SVG document for a layout, staff_space pixels per staff space.
+
+    hidden_items go in a group of class "hidden", left for the viewer to
+    show or hide.
+    """
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * staff_space:.0f}" '
+             f'height="{HEIGHT * staff_space:.0f}" viewBox="0 0 {width * staff_space:.2f} {HEIGHT * staff_space:.2f}">',
+             '<rect width="100%" height="100%" fill="white"/>']
+    _svg_items(parts, items, staff_space)
+    if hidden_items:
+        parts.append('<g class="hidden">')
+        _svg_items(parts, hidden_items, staff_space)
+        parts.append('</g>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+def _svg_items(parts, items, staff_space):
+    for item in items:
+        if item[0] == "line":
+            _, x1, y1, x2, y2, thickness = item
+            parts.append(f'<line x1="{x1 * staff_space:.2f}" y1="{y1 * staff_space:.2f}" x2="{x2 * staff_space:.2f}" '
+                         f'y2="{y2 * staff_space:.2f}" stroke="black" stroke-width="{thickness * staff_space:.2f}"/>')
+        elif item[0] == "beam":
+            _, x1, y1, x2, y2 = item
+            polygon = [(x1, y1 - BEAM / 2), (x2, y2 - BEAM / 2), (x2, y2 + BEAM / 2), (x1, y1 + BEAM / 2)]
+            parts.append(f'<polygon points="{_svg_points(polygon, 0, 0, staff_space)}" fill="black"/>')
+        else:
+            _, name, x, y = item
+            for shape in GLYPHS[name]:
+                if shape[0] == "fill":
+                    parts.append(f'<polygon points="{_svg_points(shape[1], x, y, staff_space)}" fill="black"/>')
+                else:
+                    parts.append(f'<polyline points="{_svg_points(shape[1], x, y, staff_space)}" fill="none" '
+                                 f'stroke="black" stroke-width="{shape[2] * staff_space:.2f}" '
+                                 f'stroke-linecap="round" stroke-linejoin="round"/>')
+
+def render_svg(phrase, reveal=REVEAL_EVERY, width_px=1000, staff_space=16):
+    """SVG of the full score of a phrase, with the notes hidden in the partial
+    score in a group of class "hidden" (see score_generator.hide_hidden_notes)"""
+    width = width_px / staff_space
+    items, hidden_items = score_layouts(phrase, width, reveal)
+    return layout_to_svg(items, width, staff_space, hidden_items)
+
+# pygame output
+
+# (glyph name, staff space) -> (surface, anchor offset)
+_glyph_surfaces = {}
+
+def _glyph_surface(name, staff_space, supersample=4):
+    """A glyph rasterized once per size: drawn large, then smoothly scaled down"""
+    cached = _glyph_surfaces.get((name, staff_space))
+    if cached is not None:
+        return cached
+    import pygame
+    shapes = GLYPHS[name]
+    all_points = [point for shape in shapes for point in shape[1]]
+    pad = 0.5
+    min_x = min(x for x, _ in all_points) - pad
+    min_y = min(y for _, y in all_points) - pad
+    max_x = max(x for x, _ in all_points) + pad
+    max_y = max(y for _, y in all_points) + pad
+    scale = staff_space * supersample
+    size = (math.ceil((max_x - min_x) * scale), math.ceil((max_y - min_y) * scale))
+    large = pygame.Surface(size, pygame.SRCALPHA)
+    for shape in shapes:
+        points = [((x - min_x) * scale, (y - min_y) * scale) for x, y in shape[1]]
+        if shape[0] == "fill":
+            pygame.draw.polygon(large, (0, 0, 0), points)
+        else:
+            thickness = max(1, round(shape[2] * scale))
+            pygame.draw.lines(large, (0, 0, 0), False, points, thickness)
+            for point in points:
+                pygame.draw.circle(large, (0, 0, 0), point, thickness / 2)
+    surface = pygame.transform.smoothscale(large, (max(1, size[0] // supersample), max(1, size[1] // supersample)))
+    cached = _glyph_surfaces[(name, staff_space)] = (surface, (min_x * staff_space, min_y * staff_space))
+    return cached
+
+def draw_layout(surface, items, staff_space=16, origin=(0, 0)):
+    """Draw a layout onto a pygame surface"""
+    import pygame
+    ox, oy = origin
+    for item in items:
+        if item[0] == "line":
+            _, x1, y1, x2, y2, thickness = item
+            pygame.draw.line(surface, (0, 0, 0), (ox + x1 * staff_space, oy + y1 * staff_space),
+                             (ox + x2 * staff_space, oy + y2 * staff_space), max(1, round(thickness * staff_space)))
+        elif item[0] == "beam":
+            _, x1, y1, x2, y2 = item
+            half = BEAM / 2
+            pygame.draw.polygon(surface, (0, 0, 0), [
+                (ox + x1 * staff_space, oy + (y1 - half) * staff_space), (ox + x2 * staff_space, oy + (y2 - half) * staff_space),
+                (ox + x2 * staff_space, oy + (y2 + half) * staff_space), (ox + x1 * staff_space, oy + (y1 + half) * staff_space)])
+        else:
+            _, name, x, y = item
+            glyph, (dx, dy) = _glyph_surface(name, staff_space)
+            surface.blit(glyph, (round(ox + x * staff_space + dx), round(oy + y * staff_space + dy)))
+
+def render_surfaces(phrase, reveal=REVEAL_EVERY, width_px=1000, staff_space=16):
+    """New pygame Surfaces with the (partial, full) scores of a phrase.
+
+    Both come from one layout: the full score is a copy of the partial one
+    with the hidden notes drawn in, so the two line up pixel for pixel.
+    """
+    import pygame
+    width = width_px / staff_space
+    items, hidden_items = score_layouts(phrase, width, reveal)
+    partial = pygame.Surface((width_px, round(HEIGHT * staff_space)))
+    partial.fill((255, 255, 255))
+    draw_layout(partial, items, staff_space)
+    full = partial.copy()
+    draw_layout(full, hidden_items, staff_space)
+    return partial, full
@@ -0,0 +1,70 @@
+# test_phrase_generator.py
+import random
+import pytest
+from constants import KEYS, F3_PITCH, E5_PITCH
+from music_utils import Cycler, note_to_pitch
+from phrase_generator import CHAIN_SAMPLERS, generate_phrase, get_phrase_semitones
+
+def midi(note):
+    pitch_class, octave = note_to_pitch(note)
+    return pitch_class + (octave + 1) * 12
+
+def feasible_keys(phrase_type):
+    sampler = CHAIN_SAMPLERS[phrase_type]
+    return [key_name for key_name in KEYS if sampler.is_feasible(get_phrase_semitones(phrase_type, key_name))]
+
+def test_range_is_f3_to_e5():
+    assert (F3_PITCH, E5_PITCH) == (midi("F3"), midi("E5")) == (53, 76)
+
+@pytest.mark.parametrize("phrase_type", sorted(CHAIN_SAMPLERS))
+def test_every_sampled_note_is_in_range(phrase_type):
+    for key_name in feasible_keys(phrase_type):
+        for _ in range(20):
+            notes, _, _ = generate_phrase(None, None, Cycler([key_name]), phrase_type)
+            assert all(F3_PITCH <= midi(note) <= E5_PITCH for note in notes), (key_name, notes)
+
+def test_infeasible_keys_fail_fast():
+    infeasible = {phrase_type: [semitones for semitones in range(12) if not sampler.is_feasible(semitones)]
+                  for phrase_type, sampler in CHAIN_SAMPLERS.items()}
+    assert infeasible["turnaround"] == [10, 11]
+    assert infeasible["ii7_to_v7"] == [11]
+    assert all(not semitones for phrase_type, semitones in infeasible.items()
+               if phrase_type not in ("turnaround", "ii7_to_v7"))
+    key_name = next(name for name in KEYS if get_phrase_semitones("ii7_to_v7", name) == 11)
+    with pytest.raises(ValueError, match="F3-E5"):
+        generate_phrase(None, None, Cycler([key_name]), "ii7_to_v7")
+
+def test_infeasible_keys_are_skipped_when_cycling_all_keys():
+    key_cycler = Cycler(list(KEYS))
+    keys = {generate_phrase(None, None, key_cycler, "turnaround")[1] for _ in range(36)}
+    assert keys == set(feasible_keys("turnaround"))
+
+def resolution_cells(sampler, semitones):
+    """Resolution cells that start at least one chain fitting the range"""
+    candidates, cum_weights = sampler._weighted_choices(semitones, -1, None)
+    return {cell for i, (cell, _) in enumerate(candidates) if cum_weights[i] > (cum_weights[i - 1] if i else 0)}
+
+@pytest.mark.parametrize("phrase_type", ["short_25_major", "rhythm_changes_56", "ii7_to_v7"])
+def test_rounds_use_every_resolution_cell_once(phrase_type):
+    sampler = CHAIN_SAMPLERS[phrase_type]
+    cells = resolution_cells(sampler, 0)
+    rounds, rng = {}, random.Random(1)
+    for _ in range(3):
+        drawn = [sampler.sample(0, rng, rounds)[-1] for _ in cells]
+        assert sorted(drawn) == sorted(cells)
+
+def test_rounds_keep_variety_of_uniform_sampling():
+    sampler = CHAIN_SAMPLERS["short_25_major"]
+    n = len(resolution_cells(sampler, 0))
+    rounds, rng = {}, random.Random(2)
+    chains_in_rounds = {tuple(sampler.sample(0, rng, rounds)) for _ in range(n)}
+    chains_uniform = {tuple(sampler.sample(0, rng)) for _ in range(n)}
+    assert len(chains_in_rounds) == n
+    assert len(chains_in_rounds) >= len(chains_uniform)
+
+def test_rounds_are_reproducible_from_a_seed():
+    sampler = CHAIN_SAMPLERS["long_25_minor"]
+    def run():
+        rounds, rng = {}, random.Random(7)
+        return [sampler.sample(3, rng, rounds) for _ in range(5)]
+    assert run() == run()
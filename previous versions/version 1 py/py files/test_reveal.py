@@ -0,0 +1,22 @@
+# test_reveal.py
+from score_generator import build_reveal_source, shown_accidentals
+from staff_renderer import score_layouts
+
+PHRASE = "C4 F#4 A4 G4 F#4 E4 D4 C4 B3".split()
+
+def accidentals(items):
+    return [round(item[2], 3) for item in items if item[0] == "glyph" and item[1] in ("sharp", "flat", "natural")]
+
+def test_hidden_notes_do_not_carry_accidentals_to_shown_ones():
+    assert shown_accidentals(PHRASE, {0, 4, 8}) == {4}
+    assert shown_accidentals(PHRASE, set(range(9))) == {1}
+
+def test_native_partial_score_keeps_the_sharp():
+    items, hidden_items = score_layouts(PHRASE, 60, 4)
+    assert len(accidentals(items)) == 1
+    assert len(accidentals(hidden_items)) == 1
+
+def test_lilypond_partial_score_forces_the_sharp():
+    source = build_reveal_source(PHRASE, 4)
+    assert source.count("fis'!8") == 1
+    assert "fis'8[" in source
@@ -0,0 +1,14 @@
+# test_session.py
+from session import Session, PhraseDeck, replay
+
+def test_replay_matches_phrases_generated_ahead_of_the_clicks(tmp_path):
+    session = Session(1234)
+    deck = PhraseDeck(session, "7sus4_minor", use_random_cycling=True)
+    # The prefetcher draws a few phrases before the user asks for any
+    prefetched = [deck.next_phrase()[:3] for _ in range(4)]
+    for _ in range(2):
+        session.record("next")
+    assert [action["action"] for action in session.actions] == ["start", "next", "next"]
+    path = tmp_path / "session.json"
+    session.save(path)
+    assert [result[:3] for result in replay(path)] == prefetched[:3]
@@ -0,0 +1,33 @@
+# text_cache.py
+import pygame
+from render_cache import MemoryCache
+
+# (font name, size) -> pygame Font, for the whole process. None is pygame's default font.
+_fonts = {}
+
+# Rendered text by (text, size, color, max width, font name)
+TEXT_SURFACES = MemoryCache(256)
+
+def get_font(size, name=None):
+    """The Font for name at size, loaded once"""
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.Font(name, size)
+    return font
+
+def render_text(text, size, color, name=None):
+    """Antialiased text surface, rendered once and then shared: never draw on it"""
+    return fit_text(text, color, None, size, size, name)
+
+def fit_text(text, color, max_width, size=36, min_size=16, name=None):
+    """Text rendered at the largest size, stepping down by 2 from size to
+    min_size, that is at most max_width pixels wide (any width when None)"""
+    key = (text, size, tuple(color), max_width, name)
+    surface = TEXT_SURFACES.get(key)
+    if surface is None:
+        surface = get_font(size, name).render(text, True, color)
+        while max_width is not None and surface.get_width() > max_width and size > min_size:
+            size -= 2
+            surface = get_font(size, name).render(text, True, color)
+        TEXT_SURFACES.put(key, surface)
+    return surface
@@ -1,48 +1,728 @@
 #!/usr/bin/env python3
 """
 Simple HTTP server for Music Practice Suite
-Serves files on localhost:8003
+Serves files on localhost:8004
+
+Two back ends share the same static file core:
+  threads  - a TCP server handing connections to a bounded pool of workers
+  asyncio  - an asyncio streams server, one task per connection, with the
+             file work (stat, reads, gzip) run on a pool of --workers threads
+Both speak HTTP/1.1 and keep connections open until they sit idle for
+--idle-timeout seconds.
+
+Browsers may cache everything, revalidating with ETags, and keep the
+fingerprinted scripts and stylesheets that pages link to for a year; --dev
+turns all caching off while editing. On the server side, small files are
+kept in memory between requests, up to --asset-cache-mb; large files and
+media are sent with sendfile.
+
+    python3 server.py --backend asyncio --port 8004 --bind 0.0.0.0
 """
 
+import argparse
+import asyncio
+import email.utils
+import functools
+import gzip
+import hashlib
+import html
+import http.client
 import http.server
-import socketserver
+import io
+import mimetypes
 import os
+import posixpath
+import re
+import socketserver
 import sys
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from stat import S_ISDIR, S_ISREG
 
 PORT = 8004
+WORKERS = 128
+IDLE_TIMEOUT = 5.0
+CHUNK_SIZE = 64 * 1024
+SERVER_NAME = "MusicPracticeSuite"
+
+# Cache lifetimes in production mode
+FINGERPRINT_MAX_AGE = 365 * 24 * 3600
+PREFLIGHT_MAX_AGE = 24 * 3600
+
+# Responses worth compressing, and the memory their gzip variants may take
+GZIP_MIN_SIZE = 1024
+GZIP_CACHE_BYTES = 32 * 1024 * 1024
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+# Files kept in memory between requests: their total size, the size from
+# which only their stat is kept and the body is sent with sendfile, and how
+# often a cached file is checked for changes. Audio and video are always
+# sent with sendfile.
+ASSET_CACHE_BYTES = 64 * 1024 * 1024
+MAX_CACHED_FILE_SIZE = 256 * 1024
+CHECK_INTERVAL = 1.0
+STREAMED_TYPES = ('audio/', 'video/')
+
+# Local src="..." and href="..." URLs of a page: (attribute and quote, quote, URL path, fragment)
+ASSET_URL = re.compile(r'''(\b(?:src|href)=(["']))([^"'?#]+)(?:\?[^"'#]*)?(#[^"']*)?\2''', re.IGNORECASE)
+
+class Response:
+    """Status, headers and either an in-memory body or length bytes of a file from offset"""
+    def __init__(self, status, headers=None, body=b"", path=None, length=None, offset=0):
+        self.status = status
+        self.headers = headers or []
+        self.body = body
+        self.path = path
+        self.offset = offset
+        self.length = len(body) if length is None else length
+
+    @property
+    def has_body(self):
+        """False for responses that never carry a body, nor a Content-Length"""
+        return self.status not in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED)
+
+def stat_key(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+def is_page(path):
+    return path.endswith(('.html', '.htm'))
+
+def parse_range(header, size):
+    """(first, last) byte of a single "bytes=" range, or None when the header is not one"""
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash:
+        return None
+    try:
+        if not first:
+            # The last n bytes
+            return max(size - int(last), 0), size - 1
+        first = int(first)
+        if not last:
+            # From first to the end, past it if first is beyond the end
+            return first, max(first, size - 1)
+        last = int(last)
+    except ValueError:
+        return None
+    return (first, last) if first <= last else None
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def compressible(content_type, length):
+    """Text-like content big enough for gzip to pay off"""
+    media_type = content_type.split(';')[0]
+    return length >= GZIP_MIN_SIZE and (media_type.startswith('text/') or media_type in COMPRESSIBLE_TYPES)
+
+def accepts_gzip(headers):
+    """True when Accept-Encoding allows gzip (an explicit q=0 refuses it)"""
+    qualities = {}
+    for item in headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+class GzipCache:
+    """Gzip variants of compressible files, compressed on first request.
+
+    An entry is kept under the path it belongs to with the version (stat
+    key or ETag) of the content it was made from; a newer version replaces
+    it. The least recently used entries are dropped once the variants
+    take more than max_bytes.
+    """
+    def __init__(self, max_bytes=GZIP_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        # Path -> (version, gzip bytes), least recently used first
+        self._entries = OrderedDict()
+
+    def get(self, path, version, load):
+        """Gzip variant of the content load() returns, compressed only if not cached for this version"""
+        # Lock-free hits, as in AssetCache.get
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == version:
+            try:
+                self._entries.move_to_end(path)
+            except KeyError:
+                pass
+            return entry[1]
+        data = gzip.compress(load(), compresslevel=9, mtime=0)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= len(old[1])
+            self._entries[path] = (version, data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_data) = self._entries.popitem(last=False)
+                self.total_bytes -= len(old_data)
+        return data
+
+class AssetCache:
+    """Stat, and contents of the small ones, of recently served files.
+
+    Files smaller than max_file_size are read into bytes. For bigger files,
+    and audio or video of any size, only the stat is kept: get() gives no
+    contents for them and they are sent from disk with sendfile. A cached
+    file is stat()ed again at most every check_interval seconds and
+    reloaded when its mtime or size changed. Concurrent requests for a file
+    that is not cached wait for a single read instead of each reading it.
+    The least recently used files are dropped once the contents take more
+    than max_bytes.
+    """
+    def __init__(self, max_bytes=ASSET_CACHE_BYTES, max_file_size=MAX_CACHED_FILE_SIZE, check_interval=CHECK_INTERVAL):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.check_interval = check_interval
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        # Path -> [stat, contents, time of the last stat()], least recently used first
+        self._entries = OrderedDict()
+        # Path -> Future of the read in progress
+        self._loading = {}
+
+    def get(self, path):
+        """(stat, contents) of a file; contents is None for files sent with sendfile.
+
+        Raises OSError, e.g. IsADirectoryError or FileNotFoundError, like
+        opening the file would.
+        """
+        now = time.monotonic()
+        # Hits take no lock (each call is atomic under the GIL): a hit
+        # makes no system call that lets go of the GIL, and a thread
+        # preempted while holding the lock would hold up all the others
+        entry = self._entries.get(path)
+        if entry is not None:
+            try:
+                self._entries.move_to_end(path)
+            except KeyError:
+                # Evicted in the meantime
+                pass
+            if now - entry[2] < self.check_interval:
+                return entry[0], entry[1]
+        if entry is not None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._drop(path)
+                raise
+            if stat_key(stat) == stat_key(entry[0]):
+                entry[2] = now
+                return entry[0], entry[1]
+
+        with self._lock:
+            future = self._loading.get(path)
+            loading = future is None
+            if loading:
+                future = self._loading[path] = Future()
+        if not loading:
+            return future.result()
+        try:
+            result = self._load(path)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._loading[path]
+
+    def _load(self, path):
+        stat = os.stat(path)
+        if S_ISDIR(stat.st_mode):
+            raise IsADirectoryError(path)
+        if not S_ISREG(stat.st_mode):
+            # Opening a FIFO or a device could block
+            raise FileNotFoundError(path)
+        contents = None
+        if self.keeps_contents(path, stat.st_size):
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                contents = f.read()
+        with self._lock:
+            self._pop(path)
+            self._entries[path] = [stat, contents, time.monotonic()]
+            self.total_bytes += len(contents or b'')
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_contents, _) = self._entries.popitem(last=False)
+                self.total_bytes -= len(old_contents or b'')
+        return stat, contents
+
+    def keeps_contents(self, path, size):
+        """True for files held in memory, False for those sent with sendfile"""
+        media_type = mimetypes.guess_type(path)[0] or ''
+        return size < self.max_file_size and size <= self.max_bytes and not media_type.startswith(STREAMED_TYPES)
+
+    def _pop(self, path):
+        # The caller holds the lock
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self.total_bytes -= len(old[1] or b'')
+
+    def _drop(self, path):
+        with self._lock:
+            self._pop(path)
+
+class StaticSite:
+    """Maps requests to files under root; shared by every back end.
+
+    In production mode (dev=False) every file carries an ETag and a
+    Last-Modified date, and conditional requests are answered with 304.
+    Pages are served with their local asset URLs fingerprinted
+    (styles.css?v=<hash of the file>): a request whose v matches the file's
+    current hash may be cached for a year, anything else is revalidated.
+    In dev mode nothing is cached by browsers, and files are checked for
+    changes on every request.
+    """
+    def __init__(self, root, dev=False, asset_cache_bytes=ASSET_CACHE_BYTES):
+        self.root = root
+        self.dev = dev
+        self.assets = AssetCache(asset_cache_bytes, check_interval=0 if dev else CHECK_INTERVAL)
+        # The same few URLs are requested over and over
+        self.translate_path = functools.lru_cache(maxsize=4096)(self.translate_path)
+        # Path -> (stat key, content hash)
+        self._fingerprints = {}
+        # Page path -> ([(path, stat key)] of the page and its assets, body, ETag, mtime)
+        self._pages = {}
+        self.gzip_cache = GzipCache()
+
+    def common_headers(self):
+        return [
+            # Allow cross-origin requests
+            ('Access-Control-Allow-Origin', '*'),
+            ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+            ('Access-Control-Allow-Headers', 'Content-Type'),
+        ]
+
+    def cache_headers(self, immutable=False):
+        if self.dev:
+            # Disable caching for development
+            return [('Cache-Control', 'no-cache, no-store, must-revalidate'), ('Pragma', 'no-cache'), ('Expires', '0')]
+        if immutable:
+            return [('Cache-Control', f'public, max-age={FINGERPRINT_MAX_AGE}, immutable')]
+        return [('Cache-Control', 'no-cache')]
+
+    def translate_path(self, url_path):
+        """File system path for a URL path, never outside root"""
+        trailing_slash = url_path.endswith('/')
+        path = posixpath.normpath(urllib.parse.unquote(url_path))
+        parts = [part for part in path.split('/') if part and part not in (os.curdir, os.pardir)]
+        path = os.path.join(self.root, *parts)
+        return path + '/' if trailing_slash else path
+
+    def error(self, status, message=None, headers=()):
+        text = message or status.phrase
+        body = (f'<!DOCTYPE html>\n<html><head><title>Error {status.value}</title></head>'
+                f'<body><h1>{status.value} {html.escape(text)}</h1></body></html>\n').encode()
+        return Response(status, [('Content-Type', 'text/html; charset=utf-8'), *headers,
+                                 *self.common_headers(), *self.cache_headers()], body)
+
+    def handle(self, method, target, headers):
+        """Response to a request; the caller drops the body for HEAD"""
+        if method == 'OPTIONS':
+            # CORS preflight
+            max_age = [] if self.dev else [('Access-Control-Max-Age', str(PREFLIGHT_MAX_AGE))]
+            return Response(HTTPStatus.NO_CONTENT, [*self.common_headers(), *max_age, ('Allow', 'GET, HEAD, OPTIONS')])
+        if method not in ('GET', 'HEAD'):
+            return self.error(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method})")
+        url = urllib.parse.urlsplit(target)
+        path = self.translate_path(url.path)
+        try:
+            stat, data = self.assets.get(path)
+        except IsADirectoryError:
+            if not url.path.endswith('/'):
+                location = urllib.parse.urlunsplit((url.scheme, url.netloc, url.path + '/', url.query, url.fragment))
+                return Response(HTTPStatus.MOVED_PERMANENTLY, [('Location', location), *self.common_headers()])
+            for index in ('index.html', 'index.htm'):
+                try:
+                    stat, data = self.assets.get(os.path.join(path, index))
+                except OSError:
+                    continue
+                path = os.path.join(path, index)
+                break
+            else:
+                return self.list_directory(path, url.path)
+        except OSError:
+            # Also a file requested with a trailing slash
+            return self.error(HTTPStatus.NOT_FOUND, "File not found")
+        content_type = self.guess_type(path)
+        if is_page(path) and not self.dev:
+            body, etag, mtime = self.page(path, stat, data)
+            response = Response(HTTPStatus.OK, body=body)
+            version = etag
+        else:
+            etag, mtime = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', stat.st_mtime
+            if data is None:
+                # Large files and media, zero-copy
+                response = Response(HTTPStatus.OK, path=path, length=stat.st_size)
+            else:
+                response = Response(HTTPStatus.OK, body=data)
+            version = stat_key(stat)
+
+        last_modified = ('Last-Modified', email.utils.formatdate(mtime, usegmt=True))
+        # Byte ranges refer to the uncompressed content
+        ranged = self.range_applies(headers, etag, last_modified[1])
+        vary, encoding = [], []
+        if compressible(content_type, response.length):
+            vary = [('Vary', 'Accept-Encoding')]
+            if accepts_gzip(headers) and not ranged:
+                load = (lambda: response.body) if response.path is None else (lambda: read_file(path))
+                response.body = self.gzip_cache.get(path, version, load)
+                response.path, response.length = None, len(response.body)
+                encoding = [('Content-Encoding', 'gzip')]
+                # Each encoding of a resource needs its own ETag
+                etag = etag[:-1] + '-gzip"'
+
+        if self.dev:
+            validators, cache = [last_modified], self.cache_headers()
+        else:
+            requested_version = urllib.parse.parse_qs(url.query).get('v')
+            immutable = (requested_version is not None and not is_page(path)
+                         and requested_version[-1] == self.fingerprint(path, stat, data))
+            validators, cache = [('ETag', etag), last_modified], self.cache_headers(immutable)
+            if self.not_modified(headers, etag, mtime):
+                return Response(HTTPStatus.NOT_MODIFIED, [*vary, *validators, *self.common_headers(), *cache])
+        response.headers = [('Content-Type', content_type), *encoding, *vary, *validators, *self.common_headers(), *cache]
+        if not encoding:
+            response.headers.append(('Accept-Ranges', 'bytes'))
+            if ranged:
+                return self.partial(response, headers['Range'])
+        return response
+
+    def range_applies(self, headers, etag, last_modified):
+        """True when the request has a Range header and no If-Range saying the client's copy is outdated"""
+        if 'Range' not in headers:
+            return False
+        if_range = headers.get('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', 'W/')):
+            # Strong comparison: a weak tag never matches
+            return if_range == etag
+        return if_range == last_modified
+
+    def partial(self, response, range_header):
+        """206 with one byte range of response, or 416 when the range starts past its end.
+        Unusable Range headers, including multiple ranges, get the whole response."""
+        size = response.length
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return response
+        first, last = byte_range
+        if first >= size or first > last:
+            return Response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE,
+                            [('Content-Range', f'bytes */{size}'), *self.common_headers()])
+        last = min(last, size - 1)
+        response.status = HTTPStatus.PARTIAL_CONTENT
+        response.headers.append(('Content-Range', f'bytes {first}-{last}/{size}'))
+        if response.path:
+            response.offset += first
+            response.length = last - first + 1
+        else:
+            response.body = response.body[first:last + 1]
+            response.length = len(response.body)
+        return response
+
+    def not_modified(self, headers, etag, mtime):
+        """True when the client's copy, as its conditional headers describe it, is still current"""
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            # Weak comparison, as allowed for GET
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def fingerprint(self, path, stat, data=None):
+        """Short hash of a file's contents, computed again only when its size or mtime changes"""
+        cached = self._fingerprints.get(path)
+        if cached is not None and cached[0] == stat_key(stat):
+            return cached[1]
+        if data is None:
+            data = self.assets.get(path)[1]
+        digest = hashlib.sha256()
+        if data is not None:
+            digest.update(data)
+        else:
+            with open(path, 'rb') as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        fingerprint = digest.hexdigest()[:12]
+        self._fingerprints[path] = (stat_key(stat), fingerprint)
+        return fingerprint
+
+    def asset_path(self, url, page_path):
+        """File that a URL on a page refers to, if it is a local asset that can be fingerprinted"""
+        if urllib.parse.urlsplit(url).scheme or url.startswith('//'):
+            return None
+        if url.startswith('/'):
+            path = self.translate_path(url)
+        else:
+            path = os.path.normpath(os.path.join(os.path.dirname(page_path), urllib.parse.unquote(url)))
+            if os.path.commonpath([path, self.root]) != self.root:
+                return None
+        return path if os.path.isfile(path) and not is_page(path) else None
+
+    def page(self, path, stat, data=None):
+        """(body, ETag, mtime) of a page with its asset URLs fingerprinted,
+        kept until the page or one of the assets it refers to changes"""
+        cached = self._pages.get(path)
+        if cached is not None:
+            dependencies, body, etag, mtime = cached
+            try:
+                if all(stat_key(self.assets.get(dependency)[0]) == key for dependency, key in dependencies):
+                    return body, etag, mtime
+            except OSError:
+                pass
+        dependencies = [(path, stat_key(stat))]
+        mtime = stat.st_mtime
+
+        def fingerprinted(match):
+            nonlocal mtime
+            prefix, quote, url, fragment = match.groups()
+            asset = self.asset_path(url, path)
+            if asset is None:
+                return match.group(0)
+            asset_stat, asset_data = self.assets.get(asset)
+            dependencies.append((asset, stat_key(asset_stat)))
+            mtime = max(mtime, asset_stat.st_mtime)
+            return f"{prefix}{url}?v={self.fingerprint(asset, asset_stat, asset_data)}{fragment or ''}{quote}"
+
+        if data is None:
+            data = read_file(path)
+        body = ASSET_URL.sub(fingerprinted, bytes(data).decode('utf-8')).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        self._pages[path] = (dependencies, body, etag, mtime)
+        return body, etag, mtime
+
+    def guess_type(self, path):
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        return content_type
+
+    def list_directory(self, path, url_path):
+        try:
+            names = sorted(os.listdir(path), key=str.lower)
+        except OSError:
+            return self.error(HTTPStatus.NOT_FOUND, "No permission to list directory")
+        title = f"Directory listing for {html.escape(urllib.parse.unquote(url_path))}"
+        lines = [f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{title}</title></head>',
+                 f'<body><h1>{title}</h1><hr><ul>']
+        for name in names:
+            link = name + '/' if os.path.isdir(os.path.join(path, name)) else name
+            lines.append(f'<li><a href="{urllib.parse.quote(link)}">{html.escape(link)}</a></li>')
+        lines.append('</ul><hr></body></html>\n')
+        return Response(HTTPStatus.OK, [('Content-Type', 'text/html; charset=utf-8'),
+                                        *self.common_headers(), *self.cache_headers()],
+                        '\n'.join(lines).encode())
+
+# Thread pool back end
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCPServer handing each connection to a bounded pool of worker threads.
+
+    Connections beyond the pool's size wait in its queue until a worker is
+    free; idle keep-alive connections give their worker back after
+    idle_timeout seconds.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, address, site, workers=WORKERS, idle_timeout=IDLE_TIMEOUT):
+        self.site = site
+        self.idle_timeout = idle_timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        super().__init__(address, PooledRequestHandler)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+class PooledRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = SERVER_NAME
+    # Headers and a sendfile() body go out as separate writes: without
+    # TCP_NODELAY the body waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # Socket timeout: an idle keep-alive connection is closed after this long
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    def do_GET(self):
+        self.send(self.server.site.handle(self.command, self.path, self.headers))
+
+    # The site answers the methods CORS advertises; anything else gets the stock 501
+    do_HEAD = do_POST = do_OPTIONS = do_GET
+
+    def send(self, response):
+        self.send_response(response.status)
+        for name, value in response.headers:
+            self.send_header(name, value)
+        if response.has_body:
+            self.send_header('Content-Length', str(response.length))
+        if response.status == HTTPStatus.NOT_IMPLEMENTED:
+            self.close_connection = True
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        if self.command != 'HEAD' and response.has_body and response.length:
+            if response.path:
+                with open(response.path, 'rb') as f:
+                    # Zero-copy through os.sendfile where the platform has it
+                    self.connection.sendfile(f, response.offset, response.length)
+            else:
+                self.wfile.write(response.body)
+
+def serve_threads(site, bind, port, workers, idle_timeout=IDLE_TIMEOUT):
+    with PooledHTTPServer((bind, port), site, workers, idle_timeout) as httpd:
+        print_banner(port, f"thread pool, {workers} workers", site.dev)
+        httpd.serve_forever()
+
+# asyncio back end
+
+async def read_request(reader, idle_timeout=IDLE_TIMEOUT):
+    """(method, target, version, headers) of the next request, or None when the client is gone or idle"""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), idle_timeout)
+        if not request_line.strip():
+            return None
+        header_lines = []
+        while True:
+            line = await asyncio.wait_for(reader.readline(), idle_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+            if len(header_lines) > 100:
+                return None
+    except (asyncio.TimeoutError, ConnectionError, asyncio.LimitOverrunError, ValueError):
+        return None
+    words = request_line.decode('iso-8859-1').split()
+    if len(words) != 3 or not words[2].startswith('HTTP/'):
+        return None
+    headers = http.client.parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+    return words[0], words[1], words[2], headers
+
+def wants_keep_alive(version, headers):
+    connection = headers.get('Connection', '').lower()
+    if version == 'HTTP/1.1':
+        return connection != 'close'
+    return connection == 'keep-alive'
+
+async def handle_connection(site, reader, writer, pool=None, idle_timeout=IDLE_TIMEOUT):
+    peer = writer.get_extra_info('peername')
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request = await read_request(reader, idle_timeout)
+            if request is None:
+                break
+            method, target, version, headers = request
+            keep_alive = wants_keep_alive(version, headers) and method in ('GET', 'HEAD', 'OPTIONS')
+            # stat(), reads and gzip block: keep them off the event loop
+            response = await loop.run_in_executor(pool, site.handle, method, target, headers)
+            head = [f"HTTP/1.1 {response.status.value} {response.status.phrase}",
+                    f"Server: {SERVER_NAME}",
+                    f"Date: {email.utils.formatdate(usegmt=True)}",
+                    *(f"{name}: {value}" for name, value in response.headers),
+                    *([f"Content-Length: {response.length}"] if response.has_body else []),
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            if method != 'HEAD' and response.has_body and response.length:
+                if response.path:
+                    with open(response.path, 'rb') as f:
+                        # Zero-copy through os.sendfile where the platform has it
+                        await loop.sendfile(writer.transport, f, response.offset, response.length)
+                else:
+                    writer.write(response.body)
+            await writer.drain()
+            sys.stderr.write(f'{peer[0]} - - "{method} {target} {version}" {response.status.value} -\n')
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve_asyncio(site, bind, port, workers=WORKERS, idle_timeout=IDLE_TIMEOUT):
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http") as pool:
+        server = await asyncio.start_server(lambda r, w: handle_connection(site, r, w, pool, idle_timeout),
+                                            bind or None, port, reuse_address=True, backlog=128)
+        print_banner(port, f"asyncio, {workers} file workers", site.dev)
+        async with server:
+            await server.serve_forever()
+
+def print_banner(port, backend, dev):
+    print(f"🎵 Music Practice Suite Server ({backend}{', dev mode' if dev else ''})")
+    print(f"📍 Serving at: http://localhost:{port}")
+    print(f"📁 Directory: {os.getcwd()}")
+    print(f"🔗 Main page: http://localhost:{port}")
+    print(f"🎼 Lines (Bebop): http://localhost:{port}/lines.html")
+    print(f"🎹 Voicings (Chords): http://localhost:{port}/Chord%20Practice%20Program/")
+    print(f"\n⚡ Press Ctrl+C to stop the server")
+    print("-" * 60)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Music Practice Suite server")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    parser.add_argument("--bind", default="", metavar="ADDRESS", help="address to bind (default: all interfaces)")
+    parser.add_argument("--backend", choices=["threads", "asyncio"], default="threads", help="concurrency model")
+    parser.add_argument("--workers", type=int, default=WORKERS, help=f"worker threads: one per connection for threads, file work for asyncio (default {WORKERS})")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, metavar="SECONDS",
+                        help=f"close keep-alive connections idle this long (default {IDLE_TIMEOUT:g})")
+    parser.add_argument("--dev", action="store_true", help="send no-cache headers and serve pages as they are on disk")
+    parser.add_argument("--asset-cache-mb", type=float, default=ASSET_CACHE_BYTES / 2**20, metavar="MB",
+                        help=f"memory for small files kept between requests (default {ASSET_CACHE_BYTES // 2**20}); 0 turns it off")
+    args = parser.parse_args(argv)
 
-class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def end_headers(self):
-        # Add CORS headers to allow cross-origin requests
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        # Disable caching for development
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
-        super().end_headers()
-
-def main():
     # Change to the directory containing this script
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
-        print(f"🎵 Music Practice Suite Server")
-        print(f"📍 Serving at: http://localhost:{PORT}")
-        print(f"📁 Directory: {os.getcwd()}")
-        print(f"🔗 Main page: http://localhost:{PORT}")
-        print(f"🎼 Lines (Bebop): http://localhost:{PORT}/lines.html")
-        print(f"🎹 Voicings (Chords): http://localhost:{PORT}/Chord%20Practice%20Program/")
-        print(f"\n⚡ Press Ctrl+C to stop the server")
-        print("-" * 60)
-        
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print(f"\n🛑 Server stopped.")
-            sys.exit(0)
+    site = StaticSite(os.getcwd(), dev=args.dev, asset_cache_bytes=int(args.asset_cache_mb * 2**20))
+
+    try:
+        if args.backend == "asyncio":
+            asyncio.run(serve_asyncio(site, args.bind, args.port, args.workers, args.idle_timeout))
+        else:
+            serve_threads(site, args.bind, args.port, args.workers, args.idle_timeout)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Server stopped.")
+        sys.exit(0)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,279 @@
+# test_server.py
+import asyncio
+import gzip
+import hashlib
+import re
+import threading
+import time
+from http import HTTPStatus
+from server import FINGERPRINT_MAX_AGE, MAX_CACHED_FILE_SIZE, StaticSite, handle_connection
+
+def write(path, size):
+    path.write_bytes(bytes(range(256)) * (size // 256) + b"x" * (size % 256))
+    return path.read_bytes()
+
+def header(response, name):
+    values = [value for key, value in response.headers if key == name]
+    return values[-1] if values else None
+
+def fingerprint(raw):
+    return hashlib.sha256(raw).hexdigest()[:12]
+
+def test_large_file_is_sent_from_disk(tmp_path):
+    raw = write(tmp_path / "big.bin", 2 * MAX_CACHED_FILE_SIZE)
+    site = StaticSite(str(tmp_path))
+    for _ in range(2):
+        response = site.handle("GET", "/big.bin", {})
+        assert response.status == HTTPStatus.OK
+        assert response.path == str(tmp_path / "big.bin")
+        assert response.length == len(raw) and response.body == b""
+    partial = site.handle("GET", "/big.bin", {"Range": "bytes=100-199"})
+    assert partial.status == HTTPStatus.PARTIAL_CONTENT
+    assert (partial.path, partial.offset, partial.length) == (str(tmp_path / "big.bin"), 100, 100)
+
+def test_audio_is_sent_from_disk(tmp_path):
+    write(tmp_path / "A7.mp3", 4096)
+    response = StaticSite(str(tmp_path)).handle("GET", "/A7.mp3", {})
+    assert response.path == str(tmp_path / "A7.mp3")
+
+def test_small_file_is_served_from_memory(tmp_path):
+    raw = write(tmp_path / "app.js", 4096)
+    site = StaticSite(str(tmp_path))
+    response = site.handle("GET", "/app.js", {})
+    assert response.path is None and response.body == raw
+    assert site.assets.total_bytes == len(raw)
+
+def test_unchanged_file_gets_304(tmp_path):
+    write(tmp_path / "app.js", 100)
+    site = StaticSite(str(tmp_path))
+    response = site.handle("GET", "/app.js", {})
+    etag, last_modified = header(response, "ETag"), header(response, "Last-Modified")
+    for conditional in ({"If-None-Match": etag}, {"If-None-Match": f'"other", W/{etag}'},
+                        {"If-Modified-Since": last_modified}):
+        not_modified = site.handle("GET", "/app.js", conditional)
+        assert not_modified.status == HTTPStatus.NOT_MODIFIED and not not_modified.has_body
+        assert header(not_modified, "ETag") == etag
+    assert site.handle("GET", "/app.js", {"If-None-Match": '"other"'}).status == HTTPStatus.OK
+
+def test_changed_file_is_sent_again(tmp_path):
+    write(tmp_path / "app.js", 100)
+    site = StaticSite(str(tmp_path))
+    site.assets.check_interval = 0
+    etag = header(site.handle("GET", "/app.js", {}), "ETag")
+    (tmp_path / "app.js").write_bytes(b"changed")
+    response = site.handle("GET", "/app.js", {"If-None-Match": etag})
+    assert response.status == HTTPStatus.OK and response.body == b"changed"
+    assert header(response, "ETag") != etag
+
+def test_only_the_current_fingerprint_is_immutable(tmp_path):
+    raw = write(tmp_path / "app.js", 100)
+    site = StaticSite(str(tmp_path))
+    current = site.handle("GET", f"/app.js?v={fingerprint(raw)}", {})
+    assert header(current, "Cache-Control") == f"public, max-age={FINGERPRINT_MAX_AGE}, immutable"
+    for target in ("/app.js", "/app.js?v=000000000000"):
+        assert header(site.handle("GET", target, {}), "Cache-Control") == "no-cache"
+    # A 304 for the current version keeps the year-long lifetime
+    not_modified = site.handle("GET", f"/app.js?v={fingerprint(raw)}", {"If-None-Match": header(current, "ETag")})
+    assert not_modified.status == HTTPStatus.NOT_MODIFIED
+    assert header(not_modified, "Cache-Control") == header(current, "Cache-Control")
+
+def test_pages_and_dev_mode_are_never_immutable(tmp_path):
+    raw = write(tmp_path / "app.js", 100)
+    (tmp_path / "index.html").write_text("<p>hi</p>")
+    site = StaticSite(str(tmp_path))
+    assert header(site.handle("GET", "/index.html?v=x", {}), "Cache-Control") == "no-cache"
+    dev = StaticSite(str(tmp_path), dev=True)
+    response = dev.handle("GET", f"/app.js?v={fingerprint(raw)}", {})
+    assert header(response, "Cache-Control") == "no-cache, no-store, must-revalidate"
+    assert header(response, "ETag") is None
+
+def test_page_asset_urls_get_their_fingerprint(tmp_path):
+    css = write(tmp_path / "styles.css", 100)
+    (tmp_path / "js").mkdir()
+    js = write(tmp_path / "js" / "app.js", 200)
+    (tmp_path / "index.html").write_text(
+        '<link href="styles.css?v=old">\n'
+        "<script src='/js/app.js#main'></script>\n"
+        '<script src="https://example.com/lib.js"></script>\n'
+        '<a href="other.html">other</a>\n'
+        '<img src="missing.png">\n')
+    site = StaticSite(str(tmp_path))
+    body = site.handle("GET", "/", {}).body.decode()
+    assert f'href="styles.css?v={fingerprint(css)}"' in body
+    assert f"src='/js/app.js?v={fingerprint(js)}#main'" in body
+    assert 'src="https://example.com/lib.js"' in body
+    assert 'href="other.html"' in body and 'src="missing.png"' in body
+    # Every rewritten URL is one the site answers as immutable
+    for url in re.findall(r"""(?:src|href)=["']([^"'#]+\?v=[^"'#]+)""", body):
+        assert "immutable" in header(site.handle("GET", "/" + url.lstrip("/"), {}), "Cache-Control")
+
+def test_page_is_rewritten_when_an_asset_changes(tmp_path):
+    write(tmp_path / "app.js", 100)
+    (tmp_path / "index.html").write_text('<script src="app.js"></script>')
+    site = StaticSite(str(tmp_path))
+    site.assets.check_interval = 0
+    first = site.handle("GET", "/index.html", {})
+    (tmp_path / "app.js").write_bytes(b"changed")
+    second = site.handle("GET", "/index.html", {"If-None-Match": header(first, "ETag")})
+    assert second.status == HTTPStatus.OK
+    assert f'src="app.js?v={fingerprint(b"changed")}"' in second.body.decode()
+
+def text(path, size):
+    """A compressible file of size bytes"""
+    path.write_bytes((b"function f() { return 42; }\n" * size)[:size])
+    return path.read_bytes()
+
+def test_gzip_body_decodes_to_the_file(tmp_path):
+    raw = text(tmp_path / "app.js", 50000)
+    site = StaticSite(str(tmp_path))
+    for accept in ("gzip", "gzip, deflate, br", "br;q=1.0, gzip;q=0.5", "*"):
+        response = site.handle("GET", "/app.js", {"Accept-Encoding": accept})
+        assert header(response, "Content-Encoding") == "gzip", accept
+        assert response.length == len(response.body) < len(raw)
+        assert gzip.decompress(response.body) == raw
+        assert header(response, "Vary") == "Accept-Encoding"
+        assert header(response, "ETag").endswith('-gzip"')
+
+def test_gzip_refused_gets_the_file_as_is(tmp_path):
+    raw = text(tmp_path / "app.js", 50000)
+    site = StaticSite(str(tmp_path))
+    gzipped = site.handle("GET", "/app.js", {"Accept-Encoding": "gzip"})
+    for headers in ({}, {"Accept-Encoding": ""}, {"Accept-Encoding": "identity"},
+                    {"Accept-Encoding": "gzip;q=0"}, {"Accept-Encoding": "gzip;q=0.0, identity"},
+                    {"Accept-Encoding": "*;q=0, identity"}, {"Accept-Encoding": "br"}):
+        response = site.handle("GET", "/app.js", headers)
+        assert header(response, "Content-Encoding") is None, headers
+        assert response.body == raw
+        # Caches must still keep the two variants apart
+        assert header(response, "Vary") == "Accept-Encoding"
+        assert header(response, "ETag") != header(gzipped, "ETag")
+
+def test_gzip_etag_revalidates_only_the_gzip_variant(tmp_path):
+    text(tmp_path / "app.js", 50000)
+    site = StaticSite(str(tmp_path))
+    etag = header(site.handle("GET", "/app.js", {"Accept-Encoding": "gzip"}), "ETag")
+    not_modified = site.handle("GET", "/app.js", {"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert not_modified.status == HTTPStatus.NOT_MODIFIED
+    assert header(not_modified, "Vary") == "Accept-Encoding"
+    assert site.handle("GET", "/app.js", {"If-None-Match": etag}).status == HTTPStatus.OK
+
+def test_small_and_binary_files_have_no_vary(tmp_path):
+    text(tmp_path / "tiny.js", 100)
+    write(tmp_path / "big.bin", 50000)
+    site = StaticSite(str(tmp_path))
+    for target in ("/tiny.js", "/big.bin"):
+        response = site.handle("GET", target, {"Accept-Encoding": "gzip"})
+        assert header(response, "Content-Encoding") is None and header(response, "Vary") is None
+
+def test_large_text_file_is_gzipped_from_disk(tmp_path):
+    raw = text(tmp_path / "data.json", 2 * MAX_CACHED_FILE_SIZE)
+    site = StaticSite(str(tmp_path))
+    response = site.handle("GET", "/data.json", {"Accept-Encoding": "gzip"})
+    assert response.path is None and gzip.decompress(response.body) == raw
+    assert site.handle("GET", "/data.json", {}).path == str(tmp_path / "data.json")
+
+def test_single_and_suffix_ranges(tmp_path):
+    raw = write(tmp_path / "app.bin", 1000)
+    site = StaticSite(str(tmp_path))
+    for spec, first, last in (("0-0", 0, 0), ("100-199", 100, 199), ("990-", 990, 999),
+                              ("-10", 990, 999), ("-5000", 0, 999), ("900-5000", 900, 999)):
+        response = site.handle("GET", "/app.bin", {"Range": f"bytes={spec}"})
+        assert response.status == HTTPStatus.PARTIAL_CONTENT, spec
+        assert header(response, "Content-Range") == f"bytes {first}-{last}/1000"
+        assert response.body == raw[first:last + 1] and response.length == last - first + 1
+
+def test_unusable_ranges_get_the_whole_file(tmp_path):
+    raw = write(tmp_path / "app.bin", 1000)
+    site = StaticSite(str(tmp_path))
+    for spec in ("bytes=0-9,20-29", "bytes=9-0", "items=0-9", "bytes=abc"):
+        response = site.handle("GET", "/app.bin", {"Range": spec})
+        assert response.status == HTTPStatus.OK and response.body == raw, spec
+
+def test_range_past_the_end_is_416(tmp_path):
+    write(tmp_path / "app.bin", 1000)
+    write(tmp_path / "big.bin", 2 * MAX_CACHED_FILE_SIZE)
+    site = StaticSite(str(tmp_path))
+    for target, size in (("/app.bin", 1000), ("/big.bin", 2 * MAX_CACHED_FILE_SIZE)):
+        for spec in (f"bytes={size}-", f"bytes={size + 10}-{size + 20}"):
+            response = site.handle("GET", target, {"Range": spec})
+            assert response.status == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, (target, spec)
+            assert header(response, "Content-Range") == f"bytes */{size}"
+            assert response.path is None
+
+def test_if_range(tmp_path):
+    raw = write(tmp_path / "app.bin", 1000)
+    site = StaticSite(str(tmp_path))
+    full = site.handle("GET", "/app.bin", {})
+    etag, last_modified = header(full, "ETag"), header(full, "Last-Modified")
+    for if_range in (etag, last_modified):
+        response = site.handle("GET", "/app.bin", {"Range": "bytes=0-9", "If-Range": if_range})
+        assert response.status == HTTPStatus.PARTIAL_CONTENT and response.body == raw[:10]
+    # The client's copy is outdated: it gets the whole current file
+    for if_range in ('"stale"', "W/" + etag, "Thu, 01 Jan 1970 00:00:00 GMT"):
+        response = site.handle("GET", "/app.bin", {"Range": "bytes=0-9", "If-Range": if_range})
+        assert response.status == HTTPStatus.OK and response.body == raw, if_range
+        assert header(response, "Content-Range") is None
+
+def test_partial_content_is_never_gzipped(tmp_path):
+    raw = text(tmp_path / "app.js", 50000)
+    text(tmp_path / "data.json", 2 * MAX_CACHED_FILE_SIZE)
+    site = StaticSite(str(tmp_path))
+    response = site.handle("GET", "/app.js", {"Range": "bytes=100-199", "Accept-Encoding": "gzip"})
+    assert response.status == HTTPStatus.PARTIAL_CONTENT
+    assert header(response, "Content-Encoding") is None and response.body == raw[100:200]
+    assert header(response, "ETag") == header(site.handle("GET", "/app.js", {}), "ETag")
+    response = site.handle("GET", "/data.json", {"Range": "bytes=-100", "Accept-Encoding": "gzip"})
+    assert response.status == HTTPStatus.PARTIAL_CONTENT and header(response, "Content-Encoding") is None
+    assert (response.offset, response.length) == (2 * MAX_CACHED_FILE_SIZE - 100, 100)
+    # A gzip ETag in If-Range is not the identity one: the whole file, compressed
+    gzip_etag = header(site.handle("GET", "/app.js", {"Accept-Encoding": "gzip"}), "ETag")
+    response = site.handle("GET", "/app.js", {"Range": "bytes=0-9", "If-Range": gzip_etag, "Accept-Encoding": "gzip"})
+    assert response.status == HTTPStatus.OK and gzip.decompress(response.body) == raw
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    return response
+
+def test_asyncio_back_end_handles_requests_off_the_event_loop(tmp_path):
+    write(tmp_path / "app.js", 4096)
+    site = StaticSite(str(tmp_path))
+    handle, slow_started, started_at = site.handle, threading.Event(), []
+    def slow_handle(method, target, headers):
+        if target == "/slow.js":
+            started_at.append(time.monotonic())
+            slow_started.set()
+            time.sleep(0.5)
+        return handle(method, target, headers)
+    site.handle = slow_handle
+
+    async def main():
+        server = await asyncio.start_server(lambda r, w: handle_connection(site, r, w), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            slow = asyncio.ensure_future(fetch(port, "/slow.js"))
+            while not slow_started.is_set():
+                await asyncio.sleep(0.01)
+            fast = await fetch(port, "/app.js")
+            # Served while the slow request is still being handled
+            assert time.monotonic() - started_at[0] < 0.3
+            assert fast.startswith(b"HTTP/1.1 200 ")
+            assert (await slow).startswith(b"HTTP/1.1 404 ")
+    asyncio.run(main())
+
+def test_asyncio_back_end_closes_idle_connections_after_idle_timeout(tmp_path):
+    site = StaticSite(str(tmp_path))
+
+    async def main():
+        server = await asyncio.start_server(lambda r, w: handle_connection(site, r, w, idle_timeout=0.2),
+                                            "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            start = time.monotonic()
+            assert await asyncio.wait_for(reader.read(), 2) == b""
+            assert time.monotonic() - start < 1
+            writer.close()
+    asyncio.run(main())